@@ -21,7 +21,10 @@ async def connect_to_mongo():
         database_name = os.getenv("DATABASE_NAME", "ecommerce_notifications")
         
         # Create client
-        client = AsyncIOMotorClient(mongodb_url)
+        client = AsyncIOMotorClient(
+            mongodb_url,
+            maxPoolSize=int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+        )
         database = client[database_name]
         
         # Test connection
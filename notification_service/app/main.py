@@ -1,14 +1,31 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, ORJSONResponse
 from contextlib import asynccontextmanager
 from app.database.connection import connect_to_mongo, close_mongo_connection
 from app.utils.kafka_consumer import kafka_consumer
+from app.models.notification import NotificationStatus
+from app.repositories.notification_repository import NotificationRepository
+from app.services.notification_service import NotificationService
+import os
 import logging
+import traceback
+
+IS_PRODUCTION = os.getenv("ENV", "development").lower() == "production"
 
 # Configure logging
-logging.basicConfig(level=logging.INFO)
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "WARNING" if IS_PRODUCTION else "INFO").upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+)
 logger = logging.getLogger(__name__)
 
+_STATUS_BY_VALUE = {s.value: s for s in NotificationStatus}
+
+# Shared instances used by the request handlers
+_repo = NotificationRepository()
+_svc = NotificationService()
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan events"""
@@ -32,17 +49,24 @@ app = FastAPI(
     title="Notification Service API",
     description="Microservice for handling notifications and events",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
-# Add CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # Configure this properly for production
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# Add CORS middleware only when browser origins are configured (comma-separated)
+CORS_ALLOW_ORIGINS = [
+    origin.strip()
+    for origin in os.getenv("CORS_ALLOW_ORIGINS", "").split(",")
+    if origin.strip()
+]
+if CORS_ALLOW_ORIGINS:
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=CORS_ALLOW_ORIGINS,
+        allow_credentials=True,
+        allow_methods=["GET", "POST"],
+        allow_headers=["content-type", "authorization"],
+    )
 
 
 @app.get("/")
@@ -60,18 +84,14 @@ async def health_check():
 @app.get("/api/v1/notifications/stats")
 async def get_notification_stats():
     """Get notification statistics"""
-    from app.repositories.notification_repository import NotificationRepository
-    from app.models.notification import NotificationStatus
-    
-    repo = NotificationRepository()
-    
     try:
+        counts = await _repo.get_status_counts()
         stats = {
-            "total": await repo.count_notifications(),
-            "pending": await repo.count_notifications(status=NotificationStatus.PENDING),
-            "sent": await repo.count_notifications(status=NotificationStatus.SENT),
-            "delivered": await repo.count_notifications(status=NotificationStatus.DELIVERED),
-            "failed": await repo.count_notifications(status=NotificationStatus.FAILED)
+            "total": sum(counts.values()),
+            "pending": counts.get(NotificationStatus.PENDING.value, 0),
+            "sent": counts.get(NotificationStatus.SENT.value, 0),
+            "delivered": counts.get(NotificationStatus.DELIVERED.value, 0),
+            "failed": counts.get(NotificationStatus.FAILED.value, 0)
         }
         
         return {"success": True, "data": stats}
@@ -89,33 +109,23 @@ async def get_notifications(
     offset: int = 0
 ):
     """Get notifications with optional filtering"""
-    from app.services.notification_service import NotificationService
-    from app.models.notification import NotificationStatus
-    
-    service = NotificationService()
-    
     try:
         # Validate status if provided
         notification_status = None
         if status:
-            try:
-                notification_status = NotificationStatus(status)
-            except ValueError:
+            notification_status = _STATUS_BY_VALUE.get(status)
+            if notification_status is None:
                 raise HTTPException(status_code=400, detail=f"Invalid status: {status}")
         
-        notifications = await service.get_notifications(
+        notifications = await _svc.get_notifications(
             recipient=recipient,
             status=notification_status,
             limit=limit,
             offset=offset
         )
         
-        # Convert to dict for JSON response
-        notifications_data = []
-        for notification in notifications:
-            notification_dict = notification.dict()
-            notification_dict["id"] = str(notification.id)
-            notifications_data.append(notification_dict)
+        # Convert to dict for JSON response (id is serialized as a string)
+        notifications_data = [notification.model_dump(mode="json") for notification in notifications]
         
         return {
             "success": True,
@@ -135,12 +145,8 @@ async def get_notifications(
 @app.post("/api/v1/notifications/retry-failed")
 async def retry_failed_notifications():
     """Retry failed notifications"""
-    from app.services.notification_service import NotificationService
-    
-    service = NotificationService()
-    
     try:
-        retry_count = await service.retry_failed_notifications()
+        retry_count = await _svc.retry_failed_notifications()
         
         return {
             "success": True,
@@ -157,7 +163,6 @@ async def retry_failed_notifications():
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
     """Handle HTTP exceptions"""
-    from fastapi.responses import JSONResponse
     return JSONResponse(
         status_code=exc.status_code,
         content={
@@ -171,8 +176,6 @@ async def http_exception_handler(request, exc):
 @app.exception_handler(Exception)
 async def general_exception_handler(request, exc):
     """Handle general exceptions"""
-    from fastapi.responses import JSONResponse
-    import traceback
     logger.error(f"Unhandled exception: {exc}")
     logger.error(traceback.format_exc())
     return JSONResponse(
@@ -191,6 +194,10 @@ if __name__ == "__main__":
         "main:app",
         host="0.0.0.0",
         port=8002,
-        reload=True
+        reload=not IS_PRODUCTION,
+        access_log=not IS_PRODUCTION,
+        log_level="warning" if IS_PRODUCTION else "info",
+        loop="uvloop",
+        http="httptools"
     )
 
@@ -58,7 +58,9 @@ class Notification(Document):
             "event_type",
             "created_at",
             [("recipient", 1), ("status", 1)],
-            [("event_type", 1), ("created_at", -1)]
+            [("event_type", 1), ("created_at", -1)],
+            [("status", 1), ("created_at", 1)],
+            [("status", 1), ("retry_count", 1), ("created_at", 1)]
         ]
     
     def __repr__(self) -> str:
@@ -1,16 +1,58 @@
+import logging
 from typing import List, Optional, Dict, Any
 from datetime import datetime
+from beanie import PydanticObjectId, UpdateResponse
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
 from app.models.notification import Notification, NotificationStatus
 
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY_ERROR_CODE = 11000
+
 
 class NotificationRepository:
     """Repository layer for Notification data access"""
     
-    async def create_notification(self, notification_data: Dict[str, Any]) -> Notification:
-        """Create a new notification"""
-        notification = Notification(**notification_data)
-        await notification.insert()
-        return notification
+    async def raw_insert_many(self, documents: List[Dict[str, Any]]) -> int:
+        """Insert pre-validated notification documents directly through Motor, bypassing Beanie"""
+        now = datetime.utcnow()
+        for document in documents:
+            # Assign ids up front so a failed subset can be retried by index
+            document.setdefault("_id", ObjectId())
+            document.setdefault("created_at", now)
+            document.setdefault("updated_at", now)
+        
+        collection = Notification.get_motor_collection()
+        try:
+            result = await collection.insert_many(documents, ordered=False)
+            return len(result.inserted_ids)
+        except BulkWriteError as e:
+            write_errors = e.details.get("writeErrors", [])
+            inserted = e.details.get("nInserted", 0)
+        
+        # Retry only the documents that failed for a reason other than already existing
+        failed_indexes = sorted(
+            error["index"] for error in write_errors
+            if error.get("code") != DUPLICATE_KEY_ERROR_CODE
+        )
+        logger.warning(
+            f"Raw insert failed for {len(write_errors)} of {len(documents)} notifications, "
+            f"retrying {len(failed_indexes)} individually"
+        )
+        
+        for index in failed_indexes:
+            try:
+                await collection.insert_one(documents[index])
+                inserted += 1
+            except DuplicateKeyError:
+                pass
+            except PyMongoError as insert_error:
+                logger.error(f"Failed to insert notification {documents[index]['_id']}: {insert_error}")
+                # Surface the failure so the caller does not acknowledge a batch that was not stored
+                raise
+        
+        return inserted
     
     async def get_notification_by_id(self, notification_id: str) -> Optional[Notification]:
         """Get notification by ID"""
@@ -48,22 +90,39 @@ class NotificationRepository:
         notification_id: str, 
         update_data: Dict[str, Any]
     ) -> Optional[Notification]:
-        """Update notification"""
+        """Update notification with a single atomic $set and return the updated document"""
         try:
-            notification = await Notification.get(notification_id)
-            if not notification:
-                return None
-            
-            # Update fields
-            for key, value in update_data.items():
-                setattr(notification, key, value)
-            
-            await notification.save()
-            return notification
-            
+            return await Notification.find_one(Notification.id == PydanticObjectId(notification_id)).update(
+                {"$set": update_data},
+                response_type=UpdateResponse.NEW_DOCUMENT
+            )
         except Exception:
             return None
     
+    async def update_delivery_status(
+        self,
+        notification_id: str,
+        status: NotificationStatus,
+        sent_at: Optional[datetime] = None,
+        delivered_at: Optional[datetime] = None
+    ) -> None:
+        """Record the delivery status of a notification with a single update"""
+        await Notification.find_one(Notification.id == PydanticObjectId(notification_id)).update({
+            "$set": {
+                "status": status,
+                "sent_at": sent_at,
+                "delivered_at": delivered_at,
+                "updated_at": datetime.utcnow()
+            }
+        })
+    
+    async def increment_retry_and_fail(self, notification_id: str) -> None:
+        """Mark a notification as failed and bump its retry count atomically"""
+        await Notification.find_one(Notification.id == PydanticObjectId(notification_id)).update({
+            "$set": {"status": NotificationStatus.FAILED, "updated_at": datetime.utcnow()},
+            "$inc": {"retry_count": 1}
+        })
+    
     async def delete_notification(self, notification_id: str) -> bool:
         """Delete notification"""
         try:
@@ -113,6 +172,10 @@ class NotificationRepository:
         status: Optional[NotificationStatus] = None
     ) -> int:
         """Count notifications with optional filtering"""
+        if recipient is None and status is None:
+            # Unfiltered totals come from collection metadata instead of a scan
+            return await Notification.get_motor_collection().estimated_document_count()
+        
         query = {}
         
         if recipient:
@@ -122,4 +185,11 @@ class NotificationRepository:
             query["status"] = status
         
         return await Notification.find(query).count()
-
+    
+    async def get_status_counts(self) -> Dict[str, int]:
+        """Count notifications per status with a single aggregation"""
+        result = await Notification.aggregate([
+            {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+        ]).to_list()
+        
+        return {item["_id"]: item["count"] for item in result}
@@ -1,3 +1,5 @@
+import os
+import asyncio
 import logging
 from typing import Dict, Any, List, Optional
 from datetime import datetime
@@ -6,31 +8,56 @@ from app.repositories.notification_repository import NotificationRepository
 
 logger = logging.getLogger(__name__)
 
+_TYPE_BY_VALUE = {t.value: t for t in NotificationType}
+
+# Field defaults applied to raw documents, mirroring the Notification model
+_RAW_NOTIFICATION_DEFAULTS = {
+    "subject": None,
+    "status": NotificationStatus.PENDING.value,
+    "sent_at": None,
+    "delivered_at": None,
+    "template_id": None,
+    "priority": 1,
+    "retry_count": 0,
+    "max_retries": 3
+}
+
 class NotificationService:
     """Service layer for Notification business logic"""
     
     def __init__(self):
         self.notification_repository = NotificationRepository()
+        # Bounds concurrent sends within a Kafka batch
+        self.send_semaphore = asyncio.Semaphore(int(os.getenv("NOTIFICATION_SEND_CONCURRENCY", "50")))
     
-    async def create_notification(self, notification_data: Dict[str, Any]) -> Notification:
-        """Create a new notification"""
-        try:
-            # Validate notification type
+    async def create_notifications_raw(
+        self,
+        notifications_data: List[Dict[str, Any]],
+        delivered: Optional[Dict[Any, Dict[str, Any]]] = None
+    ) -> int:
+        """Send and store trusted, already well-formed notification dicts without model validation"""
+        # delivered carries send outcomes by document id across retries of one batch, so nothing is sent twice
+        documents = []
+        for notification_data in notifications_data:
             notification_type = notification_data.get("type")
-            if notification_type not in [t.value for t in NotificationType]:
-                raise ValueError(f"Invalid notification type: {notification_type}")
-            
-            # Create notification
-            notification = await self.notification_repository.create_notification(notification_data)
-            
-            # Attempt to send the notification immediately
-            await self._send_notification(notification)
-            
-            return notification
-            
-        except Exception as e:
-            logger.error(f"Error creating notification: {e}")
-            raise
+            if notification_type not in _TYPE_BY_VALUE:
+                logger.error(f"Skipping notification with invalid type: {notification_type}")
+                continue
+            # event_data gets a fresh dict per document so inserted documents never share one
+            documents.append({**_RAW_NOTIFICATION_DEFAULTS, "event_data": {}, **notification_data})
+        
+        if not documents:
+            return 0
+        
+        results = await asyncio.gather(
+            *(self._send_raw_notification(document, delivered) for document in documents),
+            return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"Unexpected error sending batched notification: {result}")
+        
+        return await self.notification_repository.raw_insert_many(documents)
     
     async def get_notifications(
         self, 
@@ -69,124 +96,126 @@ class NotificationService:
     
     async def retry_failed_notifications(self, max_retries: int = 3) -> int:
         """Retry failed notifications that haven't exceeded max retries"""
-        failed_notifications = await self.notification_repository.get_notifications(
-            status=NotificationStatus.FAILED,
+        failed_notifications = await self.notification_repository.get_failed_notifications(
+            max_retries=max_retries,
             limit=100
         )
         
-        retry_count = 0
-        for notification in failed_notifications:
-            if notification.retry_count < max_retries:
-                try:
-                    await self._send_notification(notification)
-                    retry_count += 1
-                except Exception as e:
-                    logger.error(f"Failed to retry notification {notification.id}: {e}")
+        results = await asyncio.gather(
+            *(self._retry_notification(notification) for notification in failed_notifications),
+            return_exceptions=True
+        )
         
-        return retry_count
+        return sum(1 for result in results if result is True)
     
-    async def _send_notification(self, notification: Notification):
-        """Send a notification based on its type"""
+    async def _retry_notification(self, notification: Notification) -> bool:
+        """Resend a stored failed notification and record the outcome"""
+        async with self.send_semaphore:
+            try:
+                delivery = await self._send_notification(notification)
+            except Exception as e:
+                await self.notification_repository.increment_retry_and_fail(str(notification.id))
+                logger.error(f"Failed to retry notification {notification.id}: {e}")
+                return False
+            
+            await self.notification_repository.update_delivery_status(str(notification.id), **delivery)
+            return True
+    
+    async def _send_notification(self, notification: Notification) -> Dict[str, Any]:
+        """Send a notification based on its type and return its delivery status fields"""
         try:
             if notification.type == NotificationType.EMAIL:
-                await self._send_email_notification(notification)
+                status = await self._send_email_notification(notification)
             elif notification.type == NotificationType.SMS:
-                await self._send_sms_notification(notification)
+                status = await self._send_sms_notification(notification)
             elif notification.type == NotificationType.PUSH:
-                await self._send_push_notification(notification)
+                status = await self._send_push_notification(notification)
             elif notification.type == NotificationType.IN_APP:
-                await self._send_in_app_notification(notification)
+                status = await self._send_in_app_notification(notification)
             else:
                 raise ValueError(f"Unsupported notification type: {notification.type}")
                 
         except Exception as e:
-            # Update notification status to failed
-            await self.update_notification_status(
-                str(notification.id), 
-                NotificationStatus.FAILED
-            )
-            
-            # Increment retry count
-            await self.notification_repository.update_notification(
-                str(notification.id),
-                {
-                    "retry_count": notification.retry_count + 1,
-                    "updated_at": datetime.utcnow()
-                }
-            )
-            
-            logger.error(f"Failed to send notification {notification.id}: {e}")
+            logger.error(f"Failed to send notification to {notification.recipient}: {e}")
             raise
+        
+        now = datetime.utcnow()
+        return {
+            "status": status,
+            "sent_at": now,
+            "delivered_at": now if status == NotificationStatus.DELIVERED else None
+        }
     
-    async def _send_email_notification(self, notification: Notification):
+    async def _send_raw_notification(
+        self,
+        document: Dict[str, Any],
+        delivered: Optional[Dict[Any, Dict[str, Any]]] = None
+    ):
+        """Send a raw notification document, recording the outcome on the dict itself"""
+        notification_id = document.get("_id")
+        if delivered is not None and notification_id in delivered:
+            # Already sent on an earlier attempt at this batch; only the stored outcome is reapplied
+            document.update(delivered[notification_id])
+            return
+        
+        async with self.send_semaphore:
+            try:
+                delivery = await self._send_notification(Notification.model_construct(**document))
+            except Exception:
+                document["retry_count"] += 1
+                delivery = {"status": NotificationStatus.FAILED}
+        
+        delivery["status"] = delivery["status"].value
+        document.update(delivery)
+        if delivered is not None and notification_id is not None:
+            delivered[notification_id] = {**delivery, "retry_count": document["retry_count"]}
+    
+    async def _send_email_notification(self, notification: Notification) -> NotificationStatus:
         """Send email notification (mock implementation)"""
         # In a real implementation, you would integrate with an email service
         # like SendGrid, AWS SES, or SMTP
         
-        logger.info(f"Sending email to {notification.recipient}")
-        logger.info(f"Subject: {notification.subject}")
-        logger.info(f"Message: {notification.message}")
-        
-        # Mock successful sending
-        await self.update_notification_status(
-            str(notification.id),
-            NotificationStatus.SENT
-        )
-        
-        # Simulate delivery confirmation (in real system, this would come from email provider)
-        await self.update_notification_status(
-            str(notification.id),
-            NotificationStatus.DELIVERED,
-            datetime.utcnow()
-        )
+        logger.debug(f"Sending email to {notification.recipient}")
+        logger.debug(f"Subject: {notification.subject}")
+        logger.debug(f"Message: {notification.message}")
         
-        logger.info(f"Email notification {notification.id} sent successfully")
+        # Mock successful sending; delivery confirmation would come from the email provider
+        logger.debug(f"Email notification to {notification.recipient} sent successfully")
+        return NotificationStatus.DELIVERED
     
-    async def _send_sms_notification(self, notification: Notification):
+    async def _send_sms_notification(self, notification: Notification) -> NotificationStatus:
         """Send SMS notification (mock implementation)"""
         # In a real implementation, you would integrate with an SMS service
         # like Twilio, AWS SNS, or similar
         
-        logger.info(f"Sending SMS to {notification.recipient}")
-        logger.info(f"Message: {notification.message}")
+        logger.debug(f"Sending SMS to {notification.recipient}")
+        logger.debug(f"Message: {notification.message}")
         
         # Mock successful sending
-        await self.update_notification_status(
-            str(notification.id),
-            NotificationStatus.SENT
-        )
-        
-        logger.info(f"SMS notification {notification.id} sent successfully")
+        logger.debug(f"SMS notification to {notification.recipient} sent successfully")
+        return NotificationStatus.SENT
     
-    async def _send_push_notification(self, notification: Notification):
+    async def _send_push_notification(self, notification: Notification) -> NotificationStatus:
         """Send push notification (mock implementation)"""
         # In a real implementation, you would integrate with push notification services
         # like Firebase Cloud Messaging, Apple Push Notification Service, etc.
         
-        logger.info(f"Sending push notification to {notification.recipient}")
-        logger.info(f"Message: {notification.message}")
+        logger.debug(f"Sending push notification to {notification.recipient}")
+        logger.debug(f"Message: {notification.message}")
         
         # Mock successful sending
-        await self.update_notification_status(
-            str(notification.id),
-            NotificationStatus.SENT
-        )
-        
-        logger.info(f"Push notification {notification.id} sent successfully")
+        logger.debug(f"Push notification to {notification.recipient} sent successfully")
+        return NotificationStatus.SENT
     
-    async def _send_in_app_notification(self, notification: Notification):
+    async def _send_in_app_notification(self, notification: Notification) -> NotificationStatus:
         """Send in-app notification (mock implementation)"""
         # In a real implementation, you would store this in a user's notification inbox
         # or send via WebSocket to connected clients
         
-        logger.info(f"Creating in-app notification for {notification.recipient}")
-        logger.info(f"Message: {notification.message}")
+        logger.debug(f"Creating in-app notification for {notification.recipient}")
+        logger.debug(f"Message: {notification.message}")
         
         # Mock successful sending
-        await self.update_notification_status(
-            str(notification.id),
-            NotificationStatus.SENT
-        )
-        
-        logger.info(f"In-app notification {notification.id} created successfully")
+        logger.debug(f"In-app notification to {notification.recipient} created successfully")
+        return NotificationStatus.SENT
 
@@ -1,20 +1,48 @@
 import os
-import json
 import logging
 import asyncio
-from typing import Dict, Any, List
+import hashlib
+import orjson
+from typing import Dict, Any, List, Tuple
+from bson import ObjectId
 from aiokafka import AIOKafkaConsumer
-from aiokafka.errors import KafkaError
+from aiokafka.errors import KafkaError, IllegalStateError
 from app.services.notification_service import NotificationService
 
 logger = logging.getLogger(__name__)
 
+LOW_STOCK_THRESHOLD = 10
+
+# Backoff bounds in seconds between redeliveries of a failed batch
+BATCH_RETRY_INITIAL_DELAY = 0.5
+BATCH_RETRY_MAX_DELAY = 30.0
+
+
+def _notification_id(message) -> ObjectId:
+    """Derive a stable notification id from the Kafka record, so a redelivered record maps to the same document"""
+    source = f"{message.topic}:{message.partition}:{message.offset}".encode()
+    return ObjectId(hashlib.blake2b(source, digest_size=12).digest())
+
+
 class KafkaConsumer:
     def __init__(self):
         self.bootstrap_servers = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "localhost:9092")
         self.kafka_enabled = os.getenv("KAFKA_ENABLED", "false").lower() == "true"
+        # "api" processes serve HTTP only, so multiple workers don't all join the consumer group
+        self.role = os.getenv("ROLE", "all").lower()
         self.group_id = "notification-service-group"
         self.topics = ["user-events", "product-events"]
+        self.batch_size = int(os.getenv("KAFKA_BATCH_SIZE", "500"))
+        self.batch_timeout_ms = int(os.getenv("KAFKA_BATCH_TIMEOUT_MS", "200"))
+        # Larger fetches mean fewer broker round-trips per batch, at the cost of
+        # up to fetch_max_wait_ms extra latency when traffic is low
+        self.fetch_min_bytes = int(os.getenv("KAFKA_FETCH_MIN_BYTES", "65536"))
+        self.fetch_max_wait_ms = int(os.getenv("KAFKA_FETCH_MAX_WAIT_MS", "500"))
+        self.max_partition_fetch_bytes = int(os.getenv("KAFKA_MAX_PARTITION_FETCH_BYTES", "1048576"))
+        # A batch that keeps failing is skipped after this many redeliveries
+        self.max_batch_retries = int(os.getenv("KAFKA_MAX_BATCH_RETRIES", "5"))
+        # Delivery outcomes of notifications already sent for the batch being retried, by notification id
+        self._delivered: Dict[ObjectId, Dict[str, Any]] = {}
         self.consumer = None
         self.notification_service = NotificationService()
         self.running = False
@@ -24,17 +52,24 @@ class KafkaConsumer:
         if not self.kafka_enabled:
             logger.info("Kafka is disabled, skipping consumer initialization")
             return
+        
+        if self.role not in ("consumer", "all"):
+            logger.info(f"Role is '{self.role}', skipping consumer initialization")
+            return
             
         try:
             self.consumer = AIOKafkaConsumer(
                 *self.topics,
                 bootstrap_servers=self.bootstrap_servers,
                 group_id=self.group_id,
-                value_deserializer=lambda m: json.loads(m.decode('utf-8')),
+                value_deserializer=orjson.loads,
                 key_deserializer=lambda k: k.decode('utf-8') if k else None,
                 auto_offset_reset='latest',
-                enable_auto_commit=True,
-                auto_commit_interval_ms=1000,
+                enable_auto_commit=False,
+                fetch_min_bytes=self.fetch_min_bytes,
+                fetch_max_wait_ms=self.fetch_max_wait_ms,
+                max_partition_fetch_bytes=self.max_partition_fetch_bytes,
+                max_poll_records=self.batch_size,
                 session_timeout_ms=30000,
                 heartbeat_interval_ms=10000
             )
@@ -61,98 +96,191 @@ class KafkaConsumer:
                 logger.error(f"Error stopping Kafka consumer: {e}")
     
     async def _consume_messages(self):
-        """Consume messages from Kafka topics"""
+        """Consume messages from Kafka topics in size/time bounded batches"""
         if not self.consumer:
             return
             
-        try:
-            async for message in self.consumer:
-                if not self.running:
-                    break
-                    
+        failures = 0
+        while self.running:
+            try:
+                # Returns as soon as batch_size records are buffered or batch_timeout_ms elapses
+                batches = await self.consumer.getmany(
+                    timeout_ms=self.batch_timeout_ms,
+                    max_records=self.batch_size
+                )
+                if not batches:
+                    continue
+                
+                messages = [message for partition_messages in batches.values() for message in partition_messages]
+                
                 try:
-                    await self._process_message(message)
+                    await self._process_batch(messages)
                 except Exception as e:
-                    logger.error(f"Error processing message: {e}")
+                    failures += 1
+                    if failures <= self.max_batch_retries:
+                        delay = min(BATCH_RETRY_MAX_DELAY, BATCH_RETRY_INITIAL_DELAY * 2 ** (failures - 1))
+                        logger.error(
+                            f"Error processing batch of {len(messages)} messages "
+                            f"(attempt {failures}), retrying in {delay:.1f}s: {e}"
+                        )
+                        self._rewind(batches)
+                        await asyncio.sleep(delay)
+                        continue
                     
-        except KafkaError as e:
-            logger.error(f"Kafka consumer error: {e}")
-        except Exception as e:
-            logger.error(f"Unexpected error in message consumption: {e}")
-    
-    async def _process_message(self, message):
-        """Process a single Kafka message"""
-        try:
-            topic = message.topic
-            key = message.key
-            value = message.value
-            
-            logger.info(f"Processing message from topic '{topic}' with key '{key}'")
-            
-            # Extract event data
-            service = value.get("service", "unknown")
-            event_type = value.get("event_type", "unknown")
-            event_data = value.get("data", {})
-            
-            # Route message to appropriate handler
-            if topic == "user-events":
-                await self._handle_user_event(event_type, event_data, service)
-            elif topic == "product-events":
-                await self._handle_product_event(event_type, event_data, service)
-            else:
-                logger.warning(f"Unknown topic: {topic}")
+                    logger.error(
+                        f"Skipping batch of {len(messages)} messages after {failures} attempts: "
+                        + ", ".join(
+                            f"{partition.topic}[{partition.partition}]@{partition_messages[0].offset}"
+                            for partition, partition_messages in batches.items()
+                        )
+                    )
                 
-        except Exception as e:
-            logger.error(f"Error processing message: {e}")
-    
-    async def _handle_user_event(self, event_type: str, event_data: Dict[str, Any], service: str):
-        """Handle user-related events"""
-        try:
-            if event_type == "user.registered":
-                await self._handle_user_registered(event_data, service)
-            elif event_type == "user.login":
-                await self._handle_user_login(event_data, service)
-            elif event_type == "user.updated":
-                await self._handle_user_updated(event_data, service)
-            else:
-                logger.info(f"Unhandled user event type: {event_type}")
+                failures = 0
+                self._delivered.clear()
+                await self._commit()
                 
-        except Exception as e:
-            logger.error(f"Error handling user event '{event_type}': {e}")
+            except KafkaError as e:
+                logger.error(f"Kafka consumer error: {e}")
+                await asyncio.sleep(BATCH_RETRY_INITIAL_DELAY)
+            except Exception as e:
+                logger.error(f"Unexpected error in message consumption: {e}")
+                await asyncio.sleep(BATCH_RETRY_INITIAL_DELAY)
+    
+    def _rewind(self, batches):
+        """Seek each partition back to the start of a failed batch so it is redelivered"""
+        for partition, partition_messages in batches.items():
+            try:
+                self.consumer.seek(partition, partition_messages[0].offset)
+            except IllegalStateError:
+                # Revoked in a rebalance; its new owner resumes from the last committed offset
+                logger.warning(f"Partition {partition} no longer assigned, not rewinding it")
     
-    async def _handle_product_event(self, event_type: str, event_data: Dict[str, Any], service: str):
-        """Handle product-related events"""
+    async def _commit(self):
+        """Commit consumed offsets, tolerating failures such as a commit racing a rebalance"""
         try:
-            if event_type == "product.created":
-                await self._handle_product_created(event_data, service)
-            elif event_type == "product.stock_updated":
-                await self._handle_product_stock_updated(event_data, service)
-            else:
-                logger.info(f"Unhandled product event type: {event_type}")
+            await self.consumer.commit()
+        except KafkaError as e:
+            # The uncommitted records are redelivered, and their stable ids keep the notifications from duplicating
+            logger.warning(f"Failed to commit offsets: {e}")
+    
+    async def _process_batch(self, messages):
+        """Group a batch of Kafka messages by topic and create their notifications"""
+        user_events = []
+        product_events = []
+        
+        for message in messages:
+            try:
+                topic = message.topic
+                value = message.value
                 
-        except Exception as e:
-            logger.error(f"Error handling product event '{event_type}': {e}")
+                # Extract event data
+                event = (
+                    value.get("event_type", "unknown"),
+                    value.get("data", {}),
+                    value.get("service", "unknown"),
+                    _notification_id(message)
+                )
+                
+                if topic == "user-events":
+                    user_events.append(event)
+                elif topic == "product-events":
+                    product_events.append(event)
+                else:
+                    logger.warning(f"Unknown topic: {topic}")
+                    
+            except Exception as e:
+                logger.error(f"Error processing message: {e}")
+        
+        logger.info(
+            f"Processing batch of {len(messages)} messages "
+            f"({len(user_events)} user, {len(product_events)} product)"
+        )
+        
+        notifications_data = []
+        if user_events:
+            notifications_data.extend(await self._handle_user_events_batch(user_events))
+        if product_events:
+            notifications_data.extend(await self._handle_product_events_batch(product_events))
+        
+        if notifications_data:
+            # Payloads are built by this consumer, so they skip model validation
+            created = await self.notification_service.create_notifications_raw(
+                notifications_data, delivered=self._delivered
+            )
+            logger.info(f"Created {created} notifications from batch")
     
-    async def _handle_user_registered(self, event_data: Dict[str, Any], service: str):
-        """Handle user registration event"""
-        user_email = event_data.get("email")
-        user_name = event_data.get("name")
+    async def _handle_user_events_batch(
+        self,
+        events: List[Tuple[str, Dict[str, Any], str, ObjectId]]
+    ) -> List[Dict[str, Any]]:
+        """Handle a batch of user events, sending at most one welcome email per recipient"""
+        welcome_notifications: Dict[str, Dict[str, Any]] = {}
         
-        if user_email:
-            # Create welcome notification
-            notification_data = {
-                "type": "email",
-                "recipient": user_email,
-                "subject": "Welcome to E-commerce Platform!",
-                "message": f"Hello {user_name}, welcome to our platform! We're excited to have you on board.",
-                "event_type": "user.registered",
-                "event_data": event_data,
-                "source_service": service,
-                "priority": 3
-            }
-            
-            await self.notification_service.create_notification(notification_data)
-            logger.info(f"Created welcome notification for user: {user_email}")
+        for event_type, event_data, service, notification_id in events:
+            try:
+                if event_type == "user.registered":
+                    user_email = event_data.get("email")
+                    if user_email and user_email not in welcome_notifications:
+                        welcome_notifications[user_email] = self._build_welcome_notification(
+                            event_data, service, notification_id
+                        )
+                elif event_type == "user.login":
+                    await self._handle_user_login(event_data, service)
+                elif event_type == "user.updated":
+                    await self._handle_user_updated(event_data, service)
+                else:
+                    logger.info(f"Unhandled user event type: {event_type}")
+                    
+            except Exception as e:
+                logger.error(f"Error handling user event '{event_type}': {e}")
+        
+        return list(welcome_notifications.values())
+    
+    async def _handle_product_events_batch(
+        self,
+        events: List[Tuple[str, Dict[str, Any], str, ObjectId]]
+    ) -> List[Dict[str, Any]]:
+        """Handle a batch of product events, collapsing low stock alerts to one per product"""
+        low_stock_events: Dict[Any, Tuple[Dict[str, Any], str, ObjectId]] = {}
+        
+        for event_type, event_data, service, notification_id in events:
+            try:
+                if event_type == "product.created":
+                    await self._handle_product_created(event_data, service)
+                elif event_type == "product.stock_updated":
+                    stock_quantity = event_data.get("stock_quantity")
+                    # Send low stock alert if stock is below threshold, reporting the lowest level seen
+                    if stock_quantity is not None and stock_quantity < LOW_STOCK_THRESHOLD:
+                        product_id = event_data.get("product_id")
+                        current = low_stock_events.get(product_id)
+                        if current is None or stock_quantity < current[0]["stock_quantity"]:
+                            low_stock_events[product_id] = (event_data, service, notification_id)
+                else:
+                    logger.info(f"Unhandled product event type: {event_type}")
+                    
+            except Exception as e:
+                logger.error(f"Error handling product event '{event_type}': {e}")
+        
+        return [
+            self._build_low_stock_notification(event_data, service, notification_id)
+            for event_data, service, notification_id in low_stock_events.values()
+        ]
+    
+    def _build_welcome_notification(
+        self, event_data: Dict[str, Any], service: str, notification_id: ObjectId
+    ) -> Dict[str, Any]:
+        """Build the welcome notification for a user registration event"""
+        return {
+            "_id": notification_id,
+            "type": "email",
+            "recipient": event_data.get("email"),
+            "subject": "Welcome to E-commerce Platform!",
+            "message": f"Hello {event_data.get('name')}, welcome to our platform! We're excited to have you on board.",
+            "event_type": "user.registered",
+            "event_data": event_data,
+            "source_service": service,
+            "priority": 3
+        }
     
     async def _handle_user_login(self, event_data: Dict[str, Any], service: str):
         """Handle user login event"""
@@ -173,26 +301,24 @@ class KafkaConsumer:
         
         # In a real system, you might notify admins or send marketing notifications
     
-    async def _handle_product_stock_updated(self, event_data: Dict[str, Any], service: str):
-        """Handle product stock update event"""
+    def _build_low_stock_notification(
+        self, event_data: Dict[str, Any], service: str, notification_id: ObjectId
+    ) -> Dict[str, Any]:
+        """Build the low stock alert for a product stock update event"""
         product_id = event_data.get("product_id")
         stock_quantity = event_data.get("stock_quantity")
         
-        # Send low stock alert if stock is below threshold
-        if stock_quantity is not None and stock_quantity < 10:
-            notification_data = {
-                "type": "email",
-                "recipient": "admin@ecommerce.com",  # In real system, get from config
-                "subject": "Low Stock Alert",
-                "message": f"Product {product_id} has low stock: {stock_quantity} units remaining.",
-                "event_type": "product.stock_updated",
-                "event_data": event_data,
-                "source_service": service,
-                "priority": 4
-            }
-            
-            await self.notification_service.create_notification(notification_data)
-            logger.info(f"Created low stock alert for product: {product_id}")
+        return {
+            "_id": notification_id,
+            "type": "email",
+            "recipient": "admin@ecommerce.com",  # In real system, get from config
+            "subject": "Low Stock Alert",
+            "message": f"Product {product_id} has low stock: {stock_quantity} units remaining.",
+            "event_type": "product.stock_updated",
+            "event_data": event_data,
+            "source_service": service,
+            "priority": 4
+        }
 
 # Global consumer instance
 kafka_consumer = KafkaConsumer()
@@ -1,28 +1,48 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Header, Query
-from typing import Optional, List
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, status, Header, Query, Response
+from pydantic import BaseModel
+from typing import Optional, List, Union, Annotated
+from fastapi_cache.decorator import cache
 from app.services.order_service import OrderService
 from app.schemas.order_schemas import (
     OrderCreate, OrderResponse, OrderListResponse, OrderStats,
-    OrderStatusUpdate, PaymentUpdate, OrderSummary
+    OrderStatusUpdate, PaymentUpdate, OrderSummary, OrderSummaryListResponse
 )
 from app.models.order import OrderStatus, PaymentStatus
+from app.utils.cache import ORDER_STATS_NAMESPACE, ORDER_STATS_TTL, endpoint_key_builder
 
 # Create router
 router = APIRouter(prefix="/api/v1/orders", tags=["orders"])
 
+BEARER_PREFIX = "Bearer "
+
+# Static payload for the status options endpoint
+_STATUS_OPTIONS = {
+    "order_statuses": [status.value for status in OrderStatus],
+    "payment_statuses": [status.value for status in PaymentStatus]
+}
+
+# Shared service instance, built once at import instead of per request
+_order_service = OrderService()
+
+def _json_response(model: BaseModel, status_code: int = status.HTTP_200_OK) -> Response:
+    """Serialize a response model straight to JSON bytes with pydantic-core"""
+    return Response(content=model.model_dump_json(), status_code=status_code, media_type="application/json")
+
+
 # Dependency to get order service
-def get_order_service() -> OrderService:
-    return OrderService()
+async def get_order_service() -> OrderService:
+    return _order_service
 
 # Dependency to get authorization token
-def get_auth_token(authorization: str = Header(...)) -> str:
+async def get_auth_token(authorization: Annotated[str, Header()]) -> str:
     """Extract Bearer token from Authorization header"""
-    if not authorization.startswith("Bearer "):
+    if not authorization.startswith(BEARER_PREFIX):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid authorization header format"
         )
-    return authorization.split(" ")[1]
+    return authorization[len(BEARER_PREFIX):]
 
 
 @router.post("/", response_model=OrderResponse, status_code=status.HTTP_201_CREATED)
@@ -40,14 +60,19 @@ async def create_order(
     - **payment_method**: Payment method
     - **notes**: Optional order notes
     """
-    return await order_service.create_order(order_data, token)
+    order = await order_service.create_order(order_data, token)
+    return _json_response(order, status_code=status.HTTP_201_CREATED)
 
 
-@router.get("/", response_model=OrderListResponse)
+@router.get("/", response_model=Union[OrderSummaryListResponse, OrderListResponse])
 async def get_user_orders(
     status: Optional[OrderStatus] = Query(None, description="Filter by order status"),
     page: int = Query(1, ge=1, description="Page number"),
     per_page: int = Query(20, ge=1, le=100, description="Items per page"),
+    include_total: bool = Query(True, description="Whether to count the total number of orders"),
+    created_before: Optional[datetime] = Query(None, description="Only return orders created before this time (keyset pagination)"),
+    before_id: Optional[str] = Query(None, description="ID of the last order seen; breaks created_before ties"),
+    include_details: bool = Query(False, description="Return full orders instead of summaries"),
     token: str = Depends(get_auth_token),
     order_service: OrderService = Depends(get_order_service)
 ):
@@ -57,13 +82,22 @@ async def get_user_orders(
     - **status**: Optional filter by order status
     - **page**: Page number for pagination
     - **per_page**: Number of orders per page
+    - **include_total**: Set to false to skip counting; total and total_pages are then null
+    - **created_before**: Cursor for deep pages; pass the created_at of the last order seen (page is then ignored and returned as null)
+    - **before_id**: With created_before, the id of the last order seen, so orders sharing its created_at are not skipped
+    - **include_details**: Return full orders (items, address, metadata) instead of summaries
     """
-    return await order_service.get_user_orders(
+    orders = await order_service.get_user_orders(
         user_token=token,
         status=status,
         page=page,
-        per_page=per_page
+        per_page=per_page,
+        include_total=include_total,
+        created_before=created_before,
+        before_id=before_id,
+        include_details=include_details
     )
+    return _json_response(orders)
 
 
 @router.get("/{order_id}", response_model=OrderResponse)
@@ -77,7 +111,8 @@ async def get_order(
     
     - **order_id**: The order ID to retrieve
     """
-    return await order_service.get_order_by_id(order_id, token)
+    order = await order_service.get_order_by_id(order_id, token)
+    return _json_response(order)
 
 
 @router.patch("/{order_id}/cancel", response_model=OrderResponse)
@@ -93,7 +128,8 @@ async def cancel_order(
     
     Only orders in pending, confirmed, or processing status can be cancelled.
     """
-    return await order_service.cancel_order(order_id, token)
+    order = await order_service.cancel_order(order_id, token)
+    return _json_response(order)
 
 
 # Admin endpoints (would typically require admin authentication)
@@ -110,7 +146,8 @@ async def update_order_status(
     - **status**: New order status
     - **notes**: Optional notes about the status change
     """
-    return await order_service.update_order_status(order_id, status_update)
+    order = await order_service.update_order_status(order_id, status_update)
+    return _json_response(order)
 
 
 @router.patch("/{order_id}/payment", response_model=OrderResponse)
@@ -127,10 +164,12 @@ async def update_payment_status(
     - **payment_method**: Payment method used
     - **payment_transaction_id**: Transaction ID from payment processor
     """
-    return await order_service.update_payment_status(order_id, payment_update)
+    order = await order_service.update_payment_status(order_id, payment_update)
+    return _json_response(order)
 
 
 @router.get("/admin/stats", response_model=OrderStats)
+@cache(expire=ORDER_STATS_TTL, namespace=ORDER_STATS_NAMESPACE, key_builder=endpoint_key_builder)
 async def get_order_statistics(
     order_service: OrderService = Depends(get_order_service)
 ):
@@ -145,13 +184,17 @@ async def get_order_statistics(
     return await order_service.get_order_stats()
 
 
-@router.get("/admin/all", response_model=OrderListResponse)
+@router.get("/admin/all", response_model=Union[OrderSummaryListResponse, OrderListResponse])
 async def get_all_orders(
     status: Optional[OrderStatus] = Query(None, description="Filter by order status"),
     payment_status: Optional[PaymentStatus] = Query(None, description="Filter by payment status"),
     user_id: Optional[str] = Query(None, description="Filter by user ID"),
     page: int = Query(1, ge=1, description="Page number"),
     per_page: int = Query(50, ge=1, le=100, description="Items per page"),
+    include_total: bool = Query(True, description="Whether to count the total number of orders"),
+    created_before: Optional[datetime] = Query(None, description="Only return orders created before this time (keyset pagination)"),
+    before_id: Optional[str] = Query(None, description="ID of the last order seen; breaks created_before ties"),
+    include_details: bool = Query(False, description="Return full orders instead of summaries"),
     order_service: OrderService = Depends(get_order_service)
 ):
     """
@@ -162,42 +205,23 @@ async def get_all_orders(
     - **user_id**: Optional filter by user ID
     - **page**: Page number for pagination
     - **per_page**: Number of orders per page
+    - **include_total**: Set to false to skip counting; total and total_pages are then null
+    - **created_before**: Cursor for deep pages; pass the created_at of the last order seen (page is then ignored and returned as null)
+    - **before_id**: With created_before, the id of the last order seen, so orders sharing its created_at are not skipped
+    - **include_details**: Return full orders (items, address, metadata) instead of summaries
     """
-    from app.repositories.order_repository import OrderRepository
-    
-    repository = OrderRepository()
-    offset = (page - 1) * per_page
-    
-    orders = await repository.get_orders(
+    orders = await order_service.list_orders(
         status=status,
         payment_status=payment_status,
         user_id=user_id,
-        limit=per_page,
-        offset=offset
-    )
-    
-    total_orders = await repository.count_orders(
-        status=status,
-        payment_status=payment_status,
-        user_id=user_id
-    )
-    
-    total_pages = (total_orders + per_page - 1) // per_page
-    
-    # Convert to response format
-    order_responses = []
-    for order in orders:
-        order_service_instance = OrderService()
-        order_response = await order_service_instance._convert_to_response(order)
-        order_responses.append(order_response)
-    
-    return OrderListResponse(
-        orders=order_responses,
-        total=total_orders,
         page=page,
         per_page=per_page,
-        total_pages=total_pages
+        include_total=include_total,
+        created_before=created_before,
+        before_id=before_id,
+        include_details=include_details
     )
+    return _json_response(orders)
 
 
 # Health and utility endpoints
@@ -214,9 +238,6 @@ async def health_check():
 @router.get("/status/options")
 async def get_status_options():
     """Get available order and payment status options"""
-    return {
-        "order_statuses": [status.value for status in OrderStatus],
-        "payment_statuses": [status.value for status in PaymentStatus]
-    }
+    return _STATUS_OPTIONS
 
 
@@ -1,8 +1,12 @@
 import os
 import logging
+
+# Motor sizes its thread pool when first imported, so this must run before the import below
+os.environ.setdefault("MOTOR_MAX_WORKERS", "1")
+
 from motor.motor_asyncio import AsyncIOMotorClient
 from beanie import init_beanie
-from app.models.order import Order, OrderItem, ShippingAddress
+from app.models.order import Order
 
 logger = logging.getLogger(__name__)
 
@@ -20,8 +24,13 @@ async def connect_to_mongo():
         mongodb_url = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
         database_name = os.getenv("DATABASE_NAME", "ecommerce_orders")
         
-        # Create client
-        client = AsyncIOMotorClient(mongodb_url)
+        # Create client with a pre-warmed connection pool
+        client = AsyncIOMotorClient(
+            mongodb_url,
+            minPoolSize=int(os.getenv("MONGO_MIN_POOL_SIZE", "10")),
+            maxPoolSize=int(os.getenv("MONGO_MAX_POOL_SIZE", "50")),
+            serverSelectionTimeoutMS=int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "2000"))
+        )
         database = client[database_name]
         
         # Test connection
@@ -31,7 +40,7 @@ async def connect_to_mongo():
         # Initialize Beanie with document models
         await init_beanie(
             database=database,
-            document_models=[Order, OrderItem, ShippingAddress]
+            document_models=[Order]
         )
         logger.info("Beanie initialized successfully")
         
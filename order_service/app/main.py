@@ -1,10 +1,15 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
 from app.database.connection import connect_to_mongo, close_mongo_connection
 from app.controllers.order_controller import router as order_router
 from app.utils.kafka_producer import kafka_producer
+from app.utils.cache import init_cache, close_cache
+from app.utils.external_services import close_service_clients
+import os
 import logging
+import traceback
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -16,6 +21,7 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting Order Service...")
     await connect_to_mongo()
+    await init_cache()
     await kafka_producer.start()
     logger.info("Order Service started successfully")
     
@@ -24,6 +30,8 @@ async def lifespan(app: FastAPI):
     # Shutdown
     logger.info("Shutting down Order Service...")
     await kafka_producer.stop()
+    await close_service_clients()
+    await close_cache()
     await close_mongo_connection()
     logger.info("Order Service shut down successfully")
 
@@ -33,17 +41,24 @@ app = FastAPI(
     title="Order Service API",
     description="Microservice for order management and processing",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
-# Add CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # Configure this properly for production
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# Add CORS middleware only when browser origins are configured (comma-separated)
+CORS_ALLOW_ORIGINS = [
+    origin.strip()
+    for origin in os.getenv("CORS_ALLOW_ORIGINS", "").split(",")
+    if origin.strip()
+]
+if CORS_ALLOW_ORIGINS:
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=CORS_ALLOW_ORIGINS,
+        allow_credentials=True,
+        allow_methods=["GET", "POST", "PATCH"],
+        allow_headers=["authorization", "content-type"],
+    )
 
 # Include routers
 app.include_router(order_router)
@@ -65,8 +80,7 @@ async def health_check():
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
     """Handle HTTP exceptions"""
-    from fastapi.responses import JSONResponse
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
         content={
             "success": False,
@@ -79,11 +93,9 @@ async def http_exception_handler(request, exc):
 @app.exception_handler(Exception)
 async def general_exception_handler(request, exc):
     """Handle general exceptions"""
-    from fastapi.responses import JSONResponse
-    import traceback
     logger.error(f"Unhandled exception: {exc}")
     logger.error(traceback.format_exc())
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content={
             "success": False,
@@ -99,7 +111,9 @@ if __name__ == "__main__":
         "main:app",
         host="0.0.0.0",
         port=8003,
-        reload=True
+        reload=True,
+        loop="uvloop",
+        http="httptools"
     )
 
 
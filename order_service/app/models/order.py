@@ -1,8 +1,9 @@
 from datetime import datetime
 from typing import List, Optional, Dict, Any
 from decimal import Decimal
-from beanie import Document
-from pydantic import Field, validator
+from beanie import Document, PydanticObjectId
+from pymongo import IndexModel
+from pydantic import BaseModel, Field, model_validator
 from enum import Enum
 
 
@@ -25,8 +26,12 @@ class PaymentStatus(str, Enum):
     REFUNDED = "refunded"
 
 
-class OrderItem(Document):
-    """Order item model representing individual products in an order"""
+# Statuses from which an order can still be cancelled
+CANCELLABLE_STATUSES = [OrderStatus.PENDING, OrderStatus.CONFIRMED, OrderStatus.PROCESSING]
+
+
+class OrderItem(BaseModel):
+    """Order item embedded in an order, representing an individual product"""
     
     # Product information
     product_id: str = Field(description="Product ID from Product Service")
@@ -36,24 +41,21 @@ class OrderItem(Document):
     # Pricing and quantity
     unit_price: float = Field(description="Price per unit at time of order")
     quantity: int = Field(gt=0, description="Quantity ordered")
-    total_price: float = Field(description="Total price for this item (unit_price * quantity)")
+    total_price: float = Field(default=0.0, description="Total price for this item (unit_price * quantity)")
     
     # Metadata
     product_snapshot: Dict[str, Any] = Field(default_factory=dict, description="Product details at time of order")
     
-    class Settings:
-        name = "order_items"
-    
-    @validator('total_price', always=True)
-    def calculate_total_price(cls, v, values):
-        """Calculate total price based on unit price and quantity"""
-        unit_price = values.get('unit_price', 0)
-        quantity = values.get('quantity', 0)
-        return round(unit_price * quantity, 2)
+    @model_validator(mode="after")
+    def calculate_total_price(self) -> "OrderItem":
+        """Calculate total price when it was not provided (stored values are kept as-is)"""
+        if not self.total_price:
+            self.total_price = round(self.unit_price * self.quantity, 2)
+        return self
 
 
-class ShippingAddress(Document):
-    """Shipping address model"""
+class ShippingAddress(BaseModel):
+    """Shipping address embedded in an order"""
     
     full_name: str = Field(description="Full name for delivery")
     address_line_1: str = Field(description="Primary address line")
@@ -63,9 +65,6 @@ class ShippingAddress(Document):
     postal_code: str = Field(description="Postal/ZIP code")
     country: str = Field(description="Country")
     phone: Optional[str] = Field(None, description="Contact phone number")
-    
-    class Settings:
-        name = "shipping_addresses"
 
 
 class Order(Document):
@@ -82,11 +81,11 @@ class Order(Document):
     items: List[OrderItem] = Field(description="List of ordered items")
     
     # Pricing
-    subtotal: float = Field(description="Subtotal before taxes and shipping")
+    subtotal: float = Field(default=0.0, description="Subtotal before taxes and shipping")
     tax_amount: float = Field(default=0.0, description="Tax amount")
     shipping_cost: float = Field(default=0.0, description="Shipping cost")
     discount_amount: float = Field(default=0.0, description="Discount amount")
-    total_amount: float = Field(description="Total order amount")
+    total_amount: float = Field(default=0.0, description="Total order amount")
     
     # Status
     status: OrderStatus = Field(default=OrderStatus.PENDING, description="Order status")
@@ -110,39 +109,32 @@ class Order(Document):
     
     # Metadata
     notes: Optional[str] = Field(None, description="Order notes")
+    notes_log: List[Dict[str, Any]] = Field(default_factory=list, description="Status update notes as {ts, note} entries")
     metadata: Dict[str, Any] = Field(default_factory=dict, description="Additional metadata")
     
     class Settings:
         name = "orders"
         indexes = [
-            "order_number",
-            "user_id",
+            IndexModel([("order_number", 1)], unique=True),
             "status",
             "payment_status",
-            "created_at",
-            [("user_id", 1), ("status", 1)],
-            [("status", 1), ("created_at", -1)],
-            [("order_number", 1)]  # Unique index
+            # Listings sort on (created_at, _id) so the keyset cursor has a unique tiebreaker
+            [("created_at", -1), ("_id", -1)],  # Unfiltered admin listings
+            [("user_id", 1), ("created_at", -1), ("_id", -1)],
+            [("user_id", 1), ("status", 1), ("created_at", -1), ("_id", -1)],
+            [("status", 1), ("created_at", -1), ("_id", -1)]
         ]
     
-    @validator('total_amount', always=True)
-    def calculate_total_amount(cls, v, values):
-        """Calculate total amount"""
-        subtotal = values.get('subtotal', 0)
-        tax_amount = values.get('tax_amount', 0)
-        shipping_cost = values.get('shipping_cost', 0)
-        discount_amount = values.get('discount_amount', 0)
+    @model_validator(mode="after")
+    def calculate_totals(self) -> "Order":
+        """Calculate subtotal and total amount when they were not provided (stored values are kept as-is)"""
+        if not self.subtotal and self.items:
+            self.subtotal = round(sum(item.total_price for item in self.items), 2)
         
-        total = subtotal + tax_amount + shipping_cost - discount_amount
-        return round(max(total, 0), 2)  # Ensure non-negative
-    
-    @validator('subtotal', always=True)
-    def calculate_subtotal(cls, v, values):
-        """Calculate subtotal from items"""
-        items = values.get('items', [])
-        if items:
-            return round(sum(item.total_price for item in items), 2)
-        return v or 0
+        if not self.total_amount:
+            total = self.subtotal + self.tax_amount + self.shipping_cost - self.discount_amount
+            self.total_amount = round(max(total, 0), 2)  # Ensure non-negative
+        return self
     
     def __repr__(self) -> str:
         return f"<Order {self.order_number}: {self.status}>"
@@ -156,7 +148,7 @@ class Order(Document):
     
     def is_cancellable(self) -> bool:
         """Check if order can be cancelled"""
-        return self.status in [OrderStatus.PENDING, OrderStatus.CONFIRMED, OrderStatus.PROCESSING]
+        return self.status in CANCELLABLE_STATUSES
     
     def get_item_count(self) -> int:
         """Get total number of items in the order"""
@@ -167,3 +159,27 @@ class Order(Document):
         return [item for item in self.items if item.product_id == product_id]
 
 
+class OrderSummaryView(BaseModel):
+    """Projection of the Order fields needed for list views"""
+    
+    id: PydanticObjectId = Field(alias="_id")
+    order_number: str
+    user_id: str
+    status: OrderStatus
+    payment_status: PaymentStatus
+    total_amount: float
+    item_count: int = 0
+    created_at: datetime
+    
+    class Settings:
+        # item_count is computed server-side so the items array never leaves MongoDB
+        projection = {
+            "_id": 1,
+            "order_number": 1,
+            "user_id": 1,
+            "status": 1,
+            "payment_status": 1,
+            "total_amount": 1,
+            "item_count": {"$sum": "$items.quantity"},
+            "created_at": 1
+        }
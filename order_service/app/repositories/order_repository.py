@@ -1,7 +1,58 @@
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Type, Union, AsyncIterator
 from datetime import datetime
-from app.models.order import Order, OrderStatus, PaymentStatus
+from app.models.order import (
+    Order, OrderStatus, PaymentStatus, CANCELLABLE_STATUSES
+)
+from bson import ObjectId
+from beanie import PydanticObjectId, UpdateResponse
+from beanie.exceptions import DocumentNotFound
 from beanie.operators import In, And
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+from pydantic import BaseModel
+
+def _valid_oid(value: str) -> bool:
+    """Check an id locally so malformed ids never reach the database"""
+    return ObjectId.is_valid(value)
+
+
+def _order_filter(
+    status: Optional[OrderStatus] = None,
+    payment_status: Optional[PaymentStatus] = None,
+    user_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """Build the order listing filter shared by iter_orders and count_orders"""
+    query: Dict[str, Any] = {}
+    
+    if status:
+        query["status"] = status
+    
+    if payment_status:
+        query["payment_status"] = payment_status
+    
+    if user_id:
+        query["user_id"] = user_id
+    
+    return query
+
+
+STATUS_CREATED_AT_INDEX = [("status", 1), ("created_at", -1), ("_id", -1)]
+# _id breaks created_at ties, so keyset pages neither skip nor repeat orders created in the same millisecond
+CREATED_AT_DESC = [("created_at", -1), ("_id", -1)]
+
+# Lifecycle timestamp recorded the first time an order reaches each status
+STATUS_TIMESTAMP_FIELD = {
+    OrderStatus.CONFIRMED: "confirmed_at",
+    OrderStatus.SHIPPED: "shipped_at",
+    OrderStatus.DELIVERED: "delivered_at"
+}
+
+# Maps each status to its counter in the stats payload (refunded orders have none)
+STATUS_STAT_KEY = {
+    status: f"{status.value}_orders"
+    for status in OrderStatus
+    if status != OrderStatus.REFUNDED
+}
 
 
 class OrderRepository:
@@ -15,86 +66,69 @@ class OrderRepository:
     
     async def get_order_by_id(self, order_id: str) -> Optional[Order]:
         """Get order by ID"""
+        if not _valid_oid(order_id):
+            return None
+        
         try:
             return await Order.get(order_id)
-        except Exception:
+        except (DocumentNotFound, PyMongoError):
             return None
     
     async def get_order_by_number(self, order_number: str) -> Optional[Order]:
         """Get order by order number"""
         return await Order.find_one({"order_number": order_number})
     
-    async def get_orders_by_user(
-        self,
-        user_id: str,
-        status: Optional[OrderStatus] = None,
-        limit: int = 20,
-        offset: int = 0
-    ) -> List[Order]:
-        """Get orders for a specific user"""
-        query = {"user_id": user_id}
-        
-        if status:
-            query["status"] = status
-        
-        orders = await Order.find(query)\
-            .sort(-Order.created_at)\
-            .skip(offset)\
-            .limit(limit)\
-            .to_list()
-        
-        return orders
-    
-    async def get_orders(
+    async def iter_orders(
         self,
         status: Optional[OrderStatus] = None,
         payment_status: Optional[PaymentStatus] = None,
         user_id: Optional[str] = None,
         limit: int = 50,
-        offset: int = 0
-    ) -> List[Order]:
-        """Get orders with optional filtering"""
-        query = {}
-        
-        if status:
-            query["status"] = status
-        
-        if payment_status:
-            query["payment_status"] = payment_status
-        
-        if user_id:
-            query["user_id"] = user_id
-        
-        orders = await Order.find(query)\
-            .sort(-Order.created_at)\
-            .skip(offset)\
-            .limit(limit)\
-            .to_list()
+        offset: int = 0,
+        created_before: Optional[datetime] = None,
+        before_id: Optional[str] = None,
+        projection_model: Optional[Type[BaseModel]] = None
+    ) -> AsyncIterator[Union[Order, BaseModel]]:
+        """Stream orders from the cursor as they arrive instead of buffering the whole page"""
+        query = _order_filter(status, payment_status, user_id)
+        if created_before and before_id:
+            # Keyset cursor (created_at, _id): older orders, plus same-instant orders with a lower id
+            query["created_at"] = {"$lte": created_before}
+            query["$or"] = [
+                {"created_at": {"$lt": created_before}},
+                {"_id": {"$lt": PydanticObjectId(before_id)}}
+            ]
+        elif created_before:
+            query["created_at"] = {"$lt": created_before}
         
-        return orders
+        async for order in Order.find(
+            query,
+            projection_model=projection_model,
+            sort=CREATED_AT_DESC,
+            skip=offset,
+            limit=limit
+        ):
+            yield order
     
     async def update_order(
         self, 
         order_id: str, 
         update_data: Dict[str, Any]
     ) -> Optional[Order]:
-        """Update order"""
+        """Update order with a single $set of the changed fields"""
+        if not _valid_oid(order_id):
+            return None
+        
         try:
-            order = await Order.get(order_id)
-            if not order:
-                return None
-            
             # Update timestamp
             update_data["updated_at"] = datetime.utcnow()
             
-            # Update fields
-            for key, value in update_data.items():
-                setattr(order, key, value)
+            return await Order.find_one(Order.id == PydanticObjectId(order_id)).update(
+                {"$set": update_data},
+                response_type=UpdateResponse.NEW_DOCUMENT
+            )
             
-            await order.save()
-            return order
-            
-        except Exception:
+        except (DocumentNotFound, PyMongoError):
             return None
     
     async def update_order_status(
@@ -103,72 +137,76 @@ class OrderRepository:
         status: OrderStatus,
         notes: Optional[str] = None
     ) -> Optional[Order]:
-        """Update order status with timestamp tracking"""
+        """Update order status with timestamp tracking in a single atomic round trip"""
+        if not _valid_oid(order_id):
+            return None
+        
+        # Pipeline update so the server stamps times and only sets lifecycle timestamps once
+        updates = {"status": status.value, "updated_at": "$$NOW"}
+        
+        timestamp_field = STATUS_TIMESTAMP_FIELD.get(status)
+        if timestamp_field:
+            updates[timestamp_field] = {"$ifNull": [f"${timestamp_field}", "$$NOW"]}
+        
+        # Append notes to the structured log instead of rewriting the notes text
+        if notes:
+            updates["notes_log"] = {"$concatArrays": [
+                {"$ifNull": ["$notes_log", []]},
+                [{"ts": "$$NOW", "note": {"$literal": notes}}]
+            ]}
+        
         try:
-            order = await Order.get(order_id)
-            if not order:
-                return None
-            
-            # Update status
-            order.status = status
-            order.updated_at = datetime.utcnow()
-            
-            # Set status-specific timestamps
-            if status == OrderStatus.CONFIRMED and not order.confirmed_at:
-                order.confirmed_at = datetime.utcnow()
-            elif status == OrderStatus.SHIPPED and not order.shipped_at:
-                order.shipped_at = datetime.utcnow()
-            elif status == OrderStatus.DELIVERED and not order.delivered_at:
-                order.delivered_at = datetime.utcnow()
-            
-            # Add notes if provided
-            if notes:
-                if order.notes:
-                    order.notes += f"\n{datetime.utcnow().isoformat()}: {notes}"
-                else:
-                    order.notes = f"{datetime.utcnow().isoformat()}: {notes}"
-            
-            await order.save()
-            return order
+            document = await Order.get_motor_collection().find_one_and_update(
+                {"_id": PydanticObjectId(order_id)},
+                [{"$set": updates}],
+                return_document=ReturnDocument.AFTER
+            )
+            return Order.model_validate(document) if document else None
             
-        except Exception:
+        except (DocumentNotFound, PyMongoError):
             return None
     
     async def update_payment_status(
         self,
         order_id: str,
         payment_status: PaymentStatus,
-        payment_transaction_id: Optional[str] = None
+        payment_transaction_id: Optional[str] = None,
+        payment_method: Optional[str] = None
     ) -> Optional[Order]:
         """Update payment status"""
+        if not _valid_oid(order_id):
+            return None
+        
+        updates = {"payment_status": payment_status, "updated_at": datetime.utcnow()}
+        
+        if payment_transaction_id:
+            updates["payment_transaction_id"] = payment_transaction_id
+        
+        if payment_method:
+            updates["payment_method"] = payment_method
+        
         try:
-            order = await Order.get(order_id)
-            if not order:
-                return None
-            
-            order.payment_status = payment_status
-            order.updated_at = datetime.utcnow()
-            
-            if payment_transaction_id:
-                order.payment_transaction_id = payment_transaction_id
-            
-            await order.save()
-            return order
+            return await Order.find_one(Order.id == PydanticObjectId(order_id)).update(
+                {"$set": updates},
+                response_type=UpdateResponse.NEW_DOCUMENT
+            )
             
-        except Exception:
+        except (DocumentNotFound, PyMongoError):
             return None
     
     async def delete_order(self, order_id: str) -> bool:
         """Delete order (soft delete by setting status to cancelled)"""
-        try:
-            order = await Order.get(order_id)
-            if order and order.is_cancellable():
-                order.status = OrderStatus.CANCELLED
-                order.updated_at = datetime.utcnow()
-                await order.save()
-                return True
+        if not _valid_oid(order_id):
             return False
-        except Exception:
+        
+        try:
+            # The status filter replaces the is_cancellable() check, so no fetch is needed
+            result = await Order.get_motor_collection().update_one(
+                {"_id": PydanticObjectId(order_id), "status": {"$in": CANCELLABLE_STATUSES}},
+                {"$set": {"status": OrderStatus.CANCELLED, "updated_at": datetime.utcnow()}}
+            )
+            return result.modified_count == 1
+        except (DocumentNotFound, PyMongoError):
             return False
     
     async def count_orders(
@@ -178,18 +216,16 @@ class OrderRepository:
         user_id: Optional[str] = None
     ) -> int:
         """Count orders with optional filtering"""
-        query = {}
-        
-        if status:
-            query["status"] = status
+        query = _order_filter(status, payment_status, user_id)
+        collection = Order.get_motor_collection()
+        if not query:
+            # Unfiltered totals come from collection metadata instead of a scan
+            return await collection.estimated_document_count()
         
-        if payment_status:
-            query["payment_status"] = payment_status
+        if "status" in query and "user_id" not in query:
+            return await collection.count_documents(query, hint=STATUS_CREATED_AT_INDEX)
         
-        if user_id:
-            query["user_id"] = user_id
-        
-        return await Order.find(query).count()
+        return await collection.count_documents(query)
     
     async def get_orders_by_status(
         self, 
@@ -226,6 +262,7 @@ class OrderRepository:
     async def get_order_stats(self) -> Dict[str, Any]:
         """Get order statistics"""
         pipeline = [
+            {"$project": {"_id": 0, "status": 1, "total_amount": 1}},
             {
                 "$group": {
                     "_id": "$status",
@@ -249,36 +286,24 @@ class OrderRepository:
             "average_order_value": 0.0
         }
         
+        grand_total = 0.0
         for item in result:
             status = item["_id"]
             count = item["count"]
             total_amount = item["total_amount"]
             
             stats["total_orders"] += count
+            grand_total += total_amount
             
-            if status == OrderStatus.PENDING:
-                stats["pending_orders"] = count
-            elif status == OrderStatus.CONFIRMED:
-                stats["confirmed_orders"] = count
-            elif status == OrderStatus.PROCESSING:
-                stats["processing_orders"] = count
-            elif status == OrderStatus.SHIPPED:
-                stats["shipped_orders"] = count
-            elif status == OrderStatus.DELIVERED:
-                stats["delivered_orders"] = count
+            stat_key = STATUS_STAT_KEY.get(status)
+            if stat_key:
+                stats[stat_key] = count
+            if status == OrderStatus.DELIVERED:
                 stats["total_revenue"] += total_amount
-            elif status == OrderStatus.CANCELLED:
-                stats["cancelled_orders"] = count
         
-        # Calculate average order value
+        # Calculate average order value from the per-status totals
         if stats["total_orders"] > 0:
-            total_amount_pipeline = [
-                {"$group": {"_id": None, "total": {"$sum": "$total_amount"}}}
-            ]
-            total_result = await Order.aggregate(total_amount_pipeline).to_list()
-            if total_result:
-                total_amount = total_result[0]["total"]
-                stats["average_order_value"] = round(total_amount / stats["total_orders"], 2)
+            stats["average_order_value"] = round(grand_total / stats["total_orders"], 2)
         
         return stats
     
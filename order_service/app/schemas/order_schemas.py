@@ -58,7 +58,7 @@ class PaymentUpdate(BaseModel):
 # Response schemas
 class OrderItemResponse(BaseModel):
     """Schema for order item response"""
-    id: str = Field(description="Item ID")
+    id: Optional[str] = Field(None, description="Item ID (items are embedded and have no ID)")
     product_id: str = Field(description="Product ID")
     product_name: str = Field(description="Product name")
     product_sku: Optional[str] = Field(None, description="Product SKU")
@@ -70,7 +70,7 @@ class OrderItemResponse(BaseModel):
 
 class ShippingAddressResponse(BaseModel):
     """Schema for shipping address response"""
-    id: str = Field(description="Address ID")
+    id: Optional[str] = Field(None, description="Address ID (addresses are embedded and have no ID)")
     full_name: str = Field(description="Full name")
     address_line_1: str = Field(description="Primary address line")
     address_line_2: Optional[str] = Field(None, description="Secondary address line")
@@ -113,6 +113,7 @@ class OrderResponse(BaseModel):
     delivered_at: Optional[datetime] = Field(None, description="Delivery timestamp")
     
     notes: Optional[str] = Field(None, description="Order notes")
+    notes_log: List[Dict[str, Any]] = Field(default_factory=list, description="Status update notes")
     metadata: Dict[str, Any] = Field(description="Additional metadata")
     
     # Computed fields
@@ -124,10 +125,10 @@ class OrderResponse(BaseModel):
 class OrderListResponse(BaseModel):
     """Schema for order list response"""
     orders: List[OrderResponse] = Field(description="List of orders")
-    total: int = Field(description="Total number of orders")
-    page: int = Field(description="Current page")
+    total: Optional[int] = Field(None, description="Total number of orders (omitted when include_total is false)")
+    page: Optional[int] = Field(None, description="Current page (omitted when paging by created_before cursor)")
     per_page: int = Field(description="Items per page")
-    total_pages: int = Field(description="Total number of pages")
+    total_pages: Optional[int] = Field(None, description="Total number of pages (omitted when include_total is false)")
 
 
 class OrderSummary(BaseModel):
@@ -141,6 +142,15 @@ class OrderSummary(BaseModel):
     created_at: datetime = Field(description="Creation timestamp")
 
 
+class OrderSummaryListResponse(BaseModel):
+    """Schema for order summary list response"""
+    orders: List[OrderSummary] = Field(description="List of order summaries")
+    total: Optional[int] = Field(None, description="Total number of orders (omitted when include_total is false)")
+    page: Optional[int] = Field(None, description="Current page (omitted when paging by created_before cursor)")
+    per_page: int = Field(description="Items per page")
+    total_pages: Optional[int] = Field(None, description="Total number of pages (omitted when include_total is false)")
+
+
 class OrderStats(BaseModel):
     """Schema for order statistics"""
     total_orders: int = Field(description="Total number of orders")
@@ -1,16 +1,24 @@
-import uuid
+import math
+import time
+import secrets
+import asyncio
 import logging
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Union
 from datetime import datetime
+from bson import ObjectId
 from fastapi import HTTPException, status
 
-from app.models.order import Order, OrderItem, ShippingAddress, OrderStatus, PaymentStatus
+from app.models.order import (
+    Order, OrderItem, ShippingAddress, OrderStatus, PaymentStatus, OrderSummaryView
+)
 from app.repositories.order_repository import OrderRepository
 from app.schemas.order_schemas import (
-    OrderCreate, OrderUpdate, OrderResponse, OrderListResponse, 
-    OrderStats, OrderStatusUpdate, PaymentUpdate
+    OrderCreate, OrderItemCreate, OrderUpdate, OrderResponse, OrderListResponse, 
+    OrderStats, OrderStatusUpdate, PaymentUpdate,
+    OrderSummary, OrderSummaryListResponse, OrderItemResponse, ShippingAddressResponse
 )
 from app.utils.external_services import user_service_client, product_service_client
+from app.utils.cache import invalidate_order_stats
 from app.utils.kafka_producer import (
     publish_order_created_event, publish_order_confirmed_event,
     publish_order_cancelled_event, publish_order_shipped_event,
@@ -20,6 +28,27 @@ from app.utils.kafka_producer import (
 
 logger = logging.getLogger(__name__)
 
+# Order statuses that publish an event when an admin moves an order into them
+_PUBLISHER_BY_STATUS = {
+    OrderStatus.CONFIRMED: publish_order_confirmed_event,
+    OrderStatus.CANCELLED: publish_order_cancelled_event,
+    OrderStatus.SHIPPED: publish_order_shipped_event,
+    OrderStatus.DELIVERED: publish_order_delivered_event
+}
+
+
+def _order_event_data(order: Order, **extra: Any) -> Dict[str, Any]:
+    """Build the common event payload for an order, plus any event-specific fields"""
+    return {
+        "id": str(order.id),
+        "order_number": order.order_number,
+        "user_id": order.user_id,
+        "user_email": order.user_email,
+        "total_amount": order.total_amount,
+        **extra
+    }
+
+
 class OrderService:
     """Service layer for Order business logic"""
     
@@ -28,8 +57,8 @@ class OrderService:
     
     def _generate_order_number(self) -> str:
         """Generate unique order number"""
-        timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
-        random_suffix = str(uuid.uuid4())[:8].upper()
+        timestamp = time.strftime("%Y%m%d%H%M%S", time.gmtime())
+        random_suffix = secrets.token_hex(4).upper()
         return f"ORD-{timestamp}-{random_suffix}"
     
     async def create_order(self, order_data: OrderCreate, user_token: str) -> OrderResponse:
@@ -70,42 +99,22 @@ class OrderService:
                 )
             
             # Create order items with product information
-            order_items = []
-            subtotal = 0.0
-            
-            for item_data, reservation in zip(order_data.items, reservation_result["reservations"]):
-                if reservation["reserved"]:
-                    product = reservation["product"]
-                    
-                    # Create order item
-                    order_item = OrderItem(
-                        product_id=item_data.product_id,
-                        product_name=product["name"],
-                        product_sku=product.get("sku"),
-                        unit_price=product["price"],
-                        quantity=item_data.quantity,
-                        total_price=product["price"] * item_data.quantity,
-                        product_snapshot={
-                            "name": product["name"],
-                            "description": product.get("description", ""),
-                            "price": product["price"],
-                            "category_name": product.get("category_name"),
-                            "image_urls": product.get("image_urls", [])
-                        }
-                    )
-                    
-                    order_items.append(order_item)
-                    subtotal += order_item.total_price
+            order_items = [
+                self._build_order_item(item_data, reservation["product"])
+                for item_data, reservation in zip(order_data.items, reservation_result["reservations"])
+                if reservation["reserved"]
+            ]
+            # fsum keeps the running total exact before the single rounding step
+            subtotal = round(math.fsum(order_item.total_price for order_item in order_items), 2)
             
-            # Create shipping address
-            shipping_address = ShippingAddress(**order_data.shipping_address.dict())
-            await shipping_address.insert()
+            # Create shipping address (fields were already validated by the request schema)
+            shipping_address = ShippingAddress.model_construct(**order_data.shipping_address.__dict__)
             
             # Calculate totals (simplified tax and shipping calculation)
             tax_rate = 0.08  # 8% tax rate
             tax_amount = round(subtotal * tax_rate, 2)
             shipping_cost = 10.0 if subtotal < 100 else 0.0  # Free shipping over $100
-            total_amount = subtotal + tax_amount + shipping_cost
+            total_amount = round(subtotal + tax_amount + shipping_cost, 2)
             
             # Create order
             order_dict = {
@@ -130,14 +139,10 @@ class OrderService:
             order = await self.order_repository.create_order(order_dict)
             
             # Publish order created event
-            order_event_data = {
-                "id": str(order.id),
-                "order_number": order.order_number,
-                "user_id": order.user_id,
-                "user_email": order.user_email,
-                "total_amount": order.total_amount,
-                "item_count": order.get_item_count(),
-                "items": [
+            order_event_data = _order_event_data(
+                order,
+                item_count=order.get_item_count(),
+                items=[
                     {
                         "product_id": item.product_id,
                         "product_name": item.product_name,
@@ -146,11 +151,11 @@ class OrderService:
                     }
                     for item in order.items
                 ],
-                "created_at": order.created_at.isoformat()
-            }
+                created_at=order.created_at
+            )
             await publish_order_created_event(order_event_data)
             
-            return await self._convert_to_response(order)
+            return self._convert_to_response(order)
             
         except HTTPException:
             raise
@@ -161,17 +166,39 @@ class OrderService:
                 detail="Failed to create order"
             )
     
+    def _build_order_item(self, item_data: OrderItemCreate, product: Dict[str, Any]) -> OrderItem:
+        """Build an order item from a requested item and its reserved product"""
+        # Quantity was validated by the request schema and the product by the product service,
+        # so the item is constructed without another validation pass
+        return OrderItem.model_construct(
+            product_id=item_data.product_id,
+            product_name=product["name"],
+            product_sku=product.get("sku"),
+            unit_price=product["price"],
+            quantity=item_data.quantity,
+            total_price=round(product["price"] * item_data.quantity, 2),
+            product_snapshot={
+                "name": product["name"],
+                "description": product.get("description", ""),
+                "price": product["price"],
+                "category_name": product.get("category_name"),
+                "image_urls": product.get("image_urls", [])
+            }
+        )
+    
     async def get_order_by_id(self, order_id: str, user_token: str) -> OrderResponse:
         """Get order by ID"""
-        # Verify user token
-        user_info = await user_service_client.verify_user_token(user_token)
+        # Verify user token while the order is fetched; the token is still checked first
+        user_info, order = await asyncio.gather(
+            user_service_client.verify_user_token(user_token),
+            self.order_repository.get_order_by_id(order_id)
+        )
         if not user_info:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid or expired token"
             )
         
-        order = await self.order_repository.get_order_by_id(order_id)
         if not order:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -185,16 +212,20 @@ class OrderService:
                 detail="Access denied"
             )
         
-        return await self._convert_to_response(order)
+        return self._convert_to_response(order)
     
     async def get_user_orders(
         self, 
         user_token: str,
         status: Optional[OrderStatus] = None,
         page: int = 1,
-        per_page: int = 20
-    ) -> OrderListResponse:
-        """Get orders for authenticated user"""
+        per_page: int = 20,
+        include_total: bool = True,
+        created_before: Optional[datetime] = None,
+        before_id: Optional[str] = None,
+        include_details: bool = False
+    ) -> Union[OrderListResponse, OrderSummaryListResponse]:
+        """Get orders for authenticated user, as summaries unless include_details is set"""
         # Verify user token
         user_info = await user_service_client.verify_user_token(user_token)
         if not user_info:
@@ -203,27 +234,76 @@ class OrderService:
                 detail="Invalid or expired token"
             )
         
-        user_id = user_info["id"]
-        offset = (page - 1) * per_page
+        return await self.list_orders(
+            user_id=user_info["id"],
+            status=status,
+            page=page,
+            per_page=per_page,
+            include_total=include_total,
+            created_before=created_before,
+            before_id=before_id,
+            include_details=include_details
+        )
+    
+    async def list_orders(
+        self,
+        status: Optional[OrderStatus] = None,
+        payment_status: Optional[PaymentStatus] = None,
+        user_id: Optional[str] = None,
+        page: int = 1,
+        per_page: int = 20,
+        include_total: bool = True,
+        created_before: Optional[datetime] = None,
+        before_id: Optional[str] = None,
+        include_details: bool = False
+    ) -> Union[OrderListResponse, OrderSummaryListResponse]:
+        """List a page of orders, streaming conversion while the total is counted concurrently"""
+        if before_id and (not created_before or not ObjectId.is_valid(before_id)):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="before_id must be a valid order ID and requires created_before"
+            )
         
-        orders = await self.order_repository.get_orders_by_user(
-            user_id=user_id,
+        # Keyset pagination replaces the offset when a cursor is given
+        offset = 0 if created_before else (page - 1) * per_page
+        
+        orders = self.order_repository.iter_orders(
             status=status,
+            payment_status=payment_status,
+            user_id=user_id,
             limit=per_page,
-            offset=offset
+            offset=offset,
+            created_before=created_before,
+            before_id=before_id,
+            projection_model=None if include_details else OrderSummaryView
         )
         
-        total_orders = await self.order_repository.count_orders(user_id=user_id, status=status)
-        total_pages = (total_orders + per_page - 1) // per_page
+        convert = self._convert_to_response if include_details else self._convert_to_summary
         
-        order_responses = []
-        for order in orders:
-            order_responses.append(await self._convert_to_response(order))
+        async def collect_responses():
+            return [convert(order) async for order in orders]
         
-        return OrderListResponse(
+        total_orders = total_pages = None
+        if include_total:
+            order_responses, total_orders = await asyncio.gather(
+                collect_responses(),
+                self.order_repository.count_orders(
+                    status=status,
+                    payment_status=payment_status,
+                    user_id=user_id
+                )
+            )
+            total_pages = (total_orders + per_page - 1) // per_page
+        else:
+            order_responses = await collect_responses()
+        
+        # Every entry was already built by convert, so the envelope skips validating them again
+        response_model = OrderListResponse if include_details else OrderSummaryListResponse
+        return response_model.model_construct(
             orders=order_responses,
             total=total_orders,
-            page=page,
+            # Page numbers have no meaning when paging by cursor
+            page=None if created_before else page,
             per_page=per_page,
             total_pages=total_pages
         )
@@ -245,36 +325,24 @@ class OrderService:
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Order not found"
             )
+        await invalidate_order_stats()
         
-        # Publish appropriate events
-        order_event_data = {
-            "id": str(order.id),
-            "order_number": order.order_number,
-            "user_id": order.user_id,
-            "user_email": order.user_email,
-            "total_amount": order.total_amount,
-            "updated_at": order.updated_at.isoformat()
-        }
-        
-        if status_update.status == OrderStatus.CONFIRMED:
-            order_event_data["confirmed_at"] = order.confirmed_at.isoformat() if order.confirmed_at else None
-            await publish_order_confirmed_event(order_event_data)
-        elif status_update.status == OrderStatus.CANCELLED:
-            order_event_data["cancellation_reason"] = status_update.notes
-            await publish_order_cancelled_event(order_event_data)
-        elif status_update.status == OrderStatus.SHIPPED:
-            order_event_data.update({
-                "shipped_at": order.shipped_at.isoformat() if order.shipped_at else None,
-                "tracking_number": order.tracking_number,
-                "shipping_method": order.shipping_method,
-                "shipping_address": order.shipping_address.dict() if order.shipping_address else None
-            })
-            await publish_order_shipped_event(order_event_data)
-        elif status_update.status == OrderStatus.DELIVERED:
-            order_event_data["delivered_at"] = order.delivered_at.isoformat() if order.delivered_at else None
-            await publish_order_delivered_event(order_event_data)
+        # Publish the event for the new status, if it has one
+        publish = _PUBLISHER_BY_STATUS.get(status_update.status)
+        if publish:
+            await publish(_order_event_data(
+                order,
+                updated_at=order.updated_at,
+                confirmed_at=order.confirmed_at,
+                shipped_at=order.shipped_at,
+                delivered_at=order.delivered_at,
+                cancellation_reason=status_update.notes,
+                tracking_number=order.tracking_number,
+                shipping_method=order.shipping_method,
+                shipping_address=order.shipping_address.model_dump() if order.shipping_address else None
+            ))
         
-        return await self._convert_to_response(order)
+        return self._convert_to_response(order)
     
     async def update_payment_status(
         self, 
@@ -285,7 +353,8 @@ class OrderService:
         order = await self.order_repository.update_payment_status(
             order_id=order_id,
             payment_status=payment_update.payment_status,
-            payment_transaction_id=payment_update.payment_transaction_id
+            payment_transaction_id=payment_update.payment_transaction_id,
+            payment_method=payment_update.payment_method
         )
         
         if not order:
@@ -293,23 +362,15 @@ class OrderService:
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Order not found"
             )
-        
-        # Update order fields
-        if payment_update.payment_method:
-            order.payment_method = payment_update.payment_method
-            await order.save()
+        await invalidate_order_stats()
         
         # Publish payment events
-        payment_event_data = {
-            "id": str(order.id),
-            "order_number": order.order_number,
-            "user_id": order.user_id,
-            "user_email": order.user_email,
-            "total_amount": order.total_amount,
-            "payment_method": order.payment_method,
-            "payment_transaction_id": order.payment_transaction_id,
-            "updated_at": order.updated_at.isoformat()
-        }
+        payment_event_data = _order_event_data(
+            order,
+            payment_method=order.payment_method,
+            payment_transaction_id=order.payment_transaction_id,
+            updated_at=order.updated_at
+        )
         
         if payment_update.payment_status == PaymentStatus.PAID:
             await publish_payment_completed_event(payment_event_data)
@@ -317,19 +378,21 @@ class OrderService:
             payment_event_data["failure_reason"] = "Payment processing failed"
             await publish_payment_failed_event(payment_event_data)
         
-        return await self._convert_to_response(order)
+        return self._convert_to_response(order)
     
     async def cancel_order(self, order_id: str, user_token: str) -> OrderResponse:
         """Cancel order (user function)"""
-        # Verify user token
-        user_info = await user_service_client.verify_user_token(user_token)
+        # Verify user token while the order is fetched; the token is still checked first
+        user_info, order = await asyncio.gather(
+            user_service_client.verify_user_token(user_token),
+            self.order_repository.get_order_by_id(order_id)
+        )
         if not user_info:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid or expired token"
             )
         
-        order = await self.order_repository.get_order_by_id(order_id)
         if not order:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -358,54 +421,64 @@ class OrderService:
         )
         
         # Publish cancellation event
-        order_event_data = {
-            "id": str(cancelled_order.id),
-            "order_number": cancelled_order.order_number,
-            "user_id": cancelled_order.user_id,
-            "user_email": cancelled_order.user_email,
-            "total_amount": cancelled_order.total_amount,
-            "cancellation_reason": "Cancelled by customer",
-            "updated_at": cancelled_order.updated_at.isoformat()
-        }
+        order_event_data = _order_event_data(
+            cancelled_order,
+            cancellation_reason="Cancelled by customer",
+            updated_at=cancelled_order.updated_at
+        )
         await publish_order_cancelled_event(order_event_data)
         
-        return await self._convert_to_response(cancelled_order)
+        return self._convert_to_response(cancelled_order)
     
     async def get_order_stats(self) -> OrderStats:
         """Get order statistics (admin function)"""
         stats = await self.order_repository.get_order_stats()
-        return OrderStats(**stats)
+        # The repository always returns every stats field with the right type
+        return OrderStats.model_construct(**stats)
     
-    async def _convert_to_response(self, order: Order) -> OrderResponse:
+    def _convert_to_summary(self, order: OrderSummaryView) -> OrderSummary:
+        """Convert an OrderSummaryView projection to OrderSummary"""
+        return OrderSummary.model_construct(
+            id=str(order.id),
+            order_number=order.order_number,
+            status=order.status,
+            payment_status=order.payment_status,
+            total_amount=order.total_amount,
+            item_count=order.item_count,
+            created_at=order.created_at
+        )
+    
+    def _convert_to_response(self, order: Order) -> OrderResponse:
         """Convert Order model to OrderResponse"""
-        # Convert items
-        items_response = []
-        for item in order.items:
-            items_response.append({
-                "id": str(item.id),
-                "product_id": item.product_id,
-                "product_name": item.product_name,
-                "product_sku": item.product_sku,
-                "unit_price": item.unit_price,
-                "quantity": item.quantity,
-                "total_price": item.total_price,
-                "product_snapshot": item.product_snapshot
-            })
+        # The order was already validated when loaded, so the response models are built
+        # with model_construct instead of being validated a second time
+        items_response = [
+            OrderItemResponse.model_construct(
+                product_id=item.product_id,
+                product_name=item.product_name,
+                product_sku=item.product_sku,
+                unit_price=item.unit_price,
+                quantity=item.quantity,
+                total_price=item.total_price,
+                product_snapshot=item.product_snapshot
+            )
+            for item in order.items
+        ]
         
         # Convert shipping address
-        shipping_address_response = {
-            "id": str(order.shipping_address.id),
-            "full_name": order.shipping_address.full_name,
-            "address_line_1": order.shipping_address.address_line_1,
-            "address_line_2": order.shipping_address.address_line_2,
-            "city": order.shipping_address.city,
-            "state": order.shipping_address.state,
-            "postal_code": order.shipping_address.postal_code,
-            "country": order.shipping_address.country,
-            "phone": order.shipping_address.phone
-        }
+        address = order.shipping_address
+        shipping_address_response = ShippingAddressResponse.model_construct(
+            full_name=address.full_name,
+            address_line_1=address.address_line_1,
+            address_line_2=address.address_line_2,
+            city=address.city,
+            state=address.state,
+            postal_code=address.postal_code,
+            country=address.country,
+            phone=address.phone
+        )
         
-        return OrderResponse(
+        return OrderResponse.model_construct(
             id=str(order.id),
             order_number=order.order_number,
             user_id=order.user_id,
@@ -429,10 +502,9 @@ class OrderService:
             shipped_at=order.shipped_at,
             delivered_at=order.delivered_at,
             notes=order.notes,
+            notes_log=order.notes_log,
             metadata=order.metadata,
             item_count=order.get_item_count(),
             is_editable=order.is_editable(),
             is_cancellable=order.is_cancellable()
         )
-
-
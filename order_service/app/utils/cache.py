@@ -0,0 +1,61 @@
+import os
+import logging
+from typing import Optional, Callable, Any
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+from fastapi_cache.backends.redis import RedisBackend
+from redis import asyncio as aioredis
+
+logger = logging.getLogger(__name__)
+
+# Cache namespaces and TTLs (seconds)
+ORDER_STATS_NAMESPACE = "order_stats"
+ORDER_STATS_TTL = int(os.getenv("ORDER_STATS_CACHE_TTL", "30"))
+
+redis_client: Optional[aioredis.Redis] = None
+
+
+async def init_cache():
+    """Initialize the response cache, using Redis when REDIS_URL is set"""
+    global redis_client
+    
+    redis_url = os.getenv("REDIS_URL")
+    if redis_url:
+        redis_client = aioredis.from_url(redis_url)
+        FastAPICache.init(RedisBackend(redis_client), prefix="order-service")
+        logger.info(f"Response cache using Redis at {redis_url}")
+    else:
+        FastAPICache.init(InMemoryBackend(), prefix="order-service")
+        logger.info("REDIS_URL not set, using in-memory response cache")
+
+
+async def close_cache():
+    """Close the Redis connection used by the cache"""
+    if redis_client:
+        try:
+            await redis_client.close()
+            logger.info("Redis cache connection closed")
+        except Exception as e:
+            logger.error(f"Error closing Redis cache connection: {e}")
+
+
+def endpoint_key_builder(
+    func: Callable[..., Any],
+    namespace: str = "",
+    *,
+    request: Any = None,
+    response: Any = None,
+    args: tuple = (),
+    kwargs: Optional[dict] = None
+) -> str:
+    """Key a cached response by endpoint only, so the key is the same in every worker"""
+    # The default builder hashes the call arguments, whose injected dependencies repr to memory addresses
+    return f"{FastAPICache.get_prefix()}:{namespace}:{func.__module__}:{func.__name__}"
+
+
+async def invalidate_order_stats():
+    """Drop cached order statistics after an order changes"""
+    try:
+        await FastAPICache.clear(namespace=ORDER_STATS_NAMESPACE)
+    except Exception as e:
+        logger.error(f"Failed to invalidate order stats cache: {e}")
@@ -1,180 +1,197 @@
 import os
 import httpx
+import orjson
+import random
+import asyncio
+import hashlib
 import logging
+from cachetools import TTLCache
 from typing import Optional, Dict, Any, List
-from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Connection pool limits for each persistent service client
+HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20)
 
-class UserServiceClient:
+# HTTP/2 is only negotiated over TLS (ALPN), so it is opt-in for https service URLs
+HTTP2_ENABLED = os.getenv("SERVICE_CLIENT_HTTP2", "false").lower() == "true"
+
+# Retry policy for read-only calls: attempts, and the exponential backoff bounds in seconds
+RETRY_ATTEMPTS = int(os.getenv("SERVICE_CLIENT_RETRY_ATTEMPTS", "3"))
+RETRY_INITIAL_DELAY = 0.05
+RETRY_MAX_DELAY = 1.0
+RETRYABLE_STATUS_CODES = {502, 503, 504}
+
+# Response bodies larger than this are parsed in a worker thread to keep the event loop responsive
+LARGE_PAYLOAD_BYTES = 64_000
+
+# Maximum number of items accepted by the product service reserve endpoint
+PRODUCT_BATCH_SIZE = 100
+
+
+class ServiceClient:
+    """Base client holding one pooled httpx.AsyncClient that is reused across calls"""
+    
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self.timeout = 30.0
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=self.timeout,
+            limits=HTTP_LIMITS,
+            http2=HTTP2_ENABLED
+        )
+    
+    async def _request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Send a read-only request, retrying transport errors and gateway failures with jittered backoff"""
+        for attempt in range(1, RETRY_ATTEMPTS + 1):
+            try:
+                response = await self._client.request(method, url, **kwargs)
+                if response.status_code not in RETRYABLE_STATUS_CODES or attempt == RETRY_ATTEMPTS:
+                    return response
+            except httpx.TransportError:
+                if attempt == RETRY_ATTEMPTS:
+                    raise
+            
+            delay = min(RETRY_MAX_DELAY, RETRY_INITIAL_DELAY * 2 ** (attempt - 1))
+            await asyncio.sleep(delay + random.uniform(0, delay))
+    
+    @staticmethod
+    async def _parse_json(response: httpx.Response) -> Any:
+        """Parse a JSON response body with orjson, off the event loop when it is large"""
+        if len(response.content) > LARGE_PAYLOAD_BYTES:
+            return await asyncio.to_thread(orjson.loads, response.content)
+        return orjson.loads(response.content)
+    
+    async def aclose(self):
+        """Close the pooled connections"""
+        await self._client.aclose()
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+
+class UserServiceClient(ServiceClient):
     """Client for communicating with User Service"""
     
     def __init__(self):
-        self.base_url = os.getenv("USER_SERVICE_URL", "http://user-service:8000")
-        self.timeout = 30.0
+        super().__init__(os.getenv("USER_SERVICE_URL", "http://user-service:8000"))
+        # Recently verified tokens, so repeat requests skip the user service round trip
+        self.token_cache = TTLCache(
+            maxsize=int(os.getenv("TOKEN_CACHE_SIZE", "10000")),
+            ttl=int(os.getenv("TOKEN_CACHE_TTL", "30"))
+        )
+    
+    @staticmethod
+    def _token_cache_key(token: str) -> str:
+        """Hash the token so raw credentials are not kept as cache keys"""
+        return hashlib.blake2b(token.encode(), digest_size=16).hexdigest()
     
     async def get_user_by_id(self, user_id: str, token: str) -> Optional[Dict[str, Any]]:
         """Get user information by ID"""
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                headers = {"Authorization": f"Bearer {token}"}
-                response = await client.get(
-                    f"{self.base_url}/api/v1/users/profile/{user_id}",
-                    headers=headers
-                )
+            headers = {"Authorization": f"Bearer {token}"}
+            response = await self._request("GET", f"/api/v1/users/profile/{user_id}", headers=headers)
+            
+            if response.status_code == 200:
+                return await self._parse_json(response)
+            else:
+                logger.error(f"Failed to get user {user_id}: {response.status_code}")
+                return None
                 
-                if response.status_code == 200:
-                    return response.json()
-                else:
-                    logger.error(f"Failed to get user {user_id}: {response.status_code}")
-                    return None
-                    
         except Exception as e:
             logger.error(f"Error getting user {user_id}: {e}")
             return None
     
     async def verify_user_token(self, token: str) -> Optional[Dict[str, Any]]:
-        """Verify user token and get user info"""
+        """Verify user token and get user info, using the short-lived token cache when possible"""
+        cache_key = self._token_cache_key(token)
+        user_info = self.token_cache.get(cache_key)
+        if user_info is not None:
+            return user_info
+        
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                headers = {"Authorization": f"Bearer {token}"}
-                response = await client.get(
-                    f"{self.base_url}/api/v1/users/profile",
-                    headers=headers
-                )
+            headers = {"Authorization": f"Bearer {token}"}
+            response = await self._request("GET", "/api/v1/users/profile", headers=headers)
+            
+            if response.status_code == 200:
+                user_info = await self._parse_json(response)
+                self.token_cache[cache_key] = user_info
+                return user_info
+            else:
+                if response.status_code == 401:
+                    self.token_cache.pop(cache_key, None)
+                logger.error(f"Failed to verify token: {response.status_code}")
+                return None
                 
-                if response.status_code == 200:
-                    return response.json()
-                else:
-                    logger.error(f"Failed to verify token: {response.status_code}")
-                    return None
-                    
         except Exception as e:
             logger.error(f"Error verifying token: {e}")
             return None
 
 
-class ProductServiceClient:
+class ProductServiceClient(ServiceClient):
     """Client for communicating with Product Service"""
     
     def __init__(self):
-        self.base_url = os.getenv("PRODUCT_SERVICE_URL", "http://product-service:8001")
-        self.timeout = 30.0
-    
-    async def get_product_by_id(self, product_id: str) -> Optional[Dict[str, Any]]:
-        """Get product information by ID"""
-        try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.get(f"{self.base_url}/api/v1/products/{product_id}")
-                
-                if response.status_code == 200:
-                    return response.json()
-                else:
-                    logger.error(f"Failed to get product {product_id}: {response.status_code}")
-                    return None
-                    
-        except Exception as e:
-            logger.error(f"Error getting product {product_id}: {e}")
-            return None
-    
-    async def get_products_by_ids(self, product_ids: List[str]) -> Dict[str, Dict[str, Any]]:
-        """Get multiple products by IDs"""
-        products = {}
-        
-        for product_id in product_ids:
-            product = await self.get_product_by_id(product_id)
-            if product:
-                products[product_id] = product
-        
-        return products
-    
-    async def check_product_availability(
-        self, 
-        product_id: str, 
-        quantity: int
-    ) -> Dict[str, Any]:
-        """Check if product is available in requested quantity"""
-        try:
-            product = await self.get_product_by_id(product_id)
-            
-            if not product:
-                return {
-                    "available": False,
-                    "reason": "Product not found",
-                    "available_quantity": 0
-                }
-            
-            if not product.get("is_available", False):
-                return {
-                    "available": False,
-                    "reason": "Product not available",
-                    "available_quantity": 0
-                }
-            
-            stock_quantity = product.get("stock_quantity", 0)
-            
-            if stock_quantity < quantity:
-                return {
-                    "available": False,
-                    "reason": "Insufficient stock",
-                    "available_quantity": stock_quantity,
-                    "requested_quantity": quantity
-                }
-            
-            return {
-                "available": True,
-                "available_quantity": stock_quantity,
-                "product": product
-            }
-            
-        except Exception as e:
-            logger.error(f"Error checking product availability {product_id}: {e}")
-            return {
-                "available": False,
-                "reason": "Service error",
-                "available_quantity": 0
-            }
+        super().__init__(os.getenv("PRODUCT_SERVICE_URL", "http://product-service:8001"))
+        # Products are deliberately not cached here: reservations are the only product calls and
+        # must be checked against live stock, so a cached stock level could reject or accept wrongly
+        # Caps in-flight product service requests so large fan-outs queue here instead of stampeding it
+        self.request_semaphore = asyncio.Semaphore(int(os.getenv("PRODUCT_CLIENT_CONCURRENCY", "32")))
     
     async def reserve_products(
         self, 
         items: List[Dict[str, Any]]
     ) -> Dict[str, Any]:
-        """Reserve products for an order (mock implementation)"""
-        # In a real implementation, this would call a product reservation endpoint
-        # For now, we'll just validate availability
-        
-        reservations = []
-        total_reserved = 0
+        """Reserve products for an order, one product service call per batch of items (validates availability only)"""
+        chunks = [
+            items[i:i + PRODUCT_BATCH_SIZE]
+            for i in range(0, len(items), PRODUCT_BATCH_SIZE)
+        ]
+        results = await asyncio.gather(*(self._reserve_products_batch(chunk) for chunk in chunks))
         
-        for item in items:
-            product_id = item["product_id"]
-            quantity = item["quantity"]
-            
-            availability = await self.check_product_availability(product_id, quantity)
+        return {
+            "success": all(result["success"] for result in results),
+            "total_items": len(items),
+            "reserved_items": sum(result["reserved_items"] for result in results),
+            "reservations": [
+                reservation
+                for result in results
+                for reservation in result["reservations"]
+            ]
+        }
+    
+    async def _reserve_products_batch(self, items: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Reserve one batch of items, reporting every item as failed if the call does not succeed"""
+        try:
+            async with self.request_semaphore:
+                response = await self._request("POST", "/api/v1/products/reserve", json={"items": items})
             
-            if availability["available"]:
-                reservations.append({
-                    "product_id": product_id,
-                    "quantity": quantity,
-                    "reserved": True,
-                    "product": availability["product"]
-                })
-                total_reserved += 1
+            if response.status_code == 200:
+                return await self._parse_json(response)
             else:
-                reservations.append({
-                    "product_id": product_id,
-                    "quantity": quantity,
-                    "reserved": False,
-                    "reason": availability["reason"],
-                    "available_quantity": availability.get("available_quantity", 0)
-                })
+                logger.error(f"Failed to reserve products: {response.status_code}")
+                
+        except Exception as e:
+            logger.error(f"Error reserving products: {e}")
         
         return {
-            "success": total_reserved == len(items),
+            "success": False,
             "total_items": len(items),
-            "reserved_items": total_reserved,
-            "reservations": reservations
+            "reserved_items": 0,
+            "reservations": [
+                {
+                    "product_id": item["product_id"],
+                    "quantity": item["quantity"],
+                    "reserved": False,
+                    "reason": "Service error",
+                    "available_quantity": 0
+                }
+                for item in items
+            ]
         }
     
     async def update_product_stock(
@@ -190,14 +207,13 @@ class ProductServiceClient:
             logger.info(f"Stock update request for product {product_id}: {quantity_change}")
             
             # Mock API call
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.patch(
-                    f"{self.base_url}/api/v1/products/{product_id}/stock",
-                    json={"quantity_change": quantity_change}
-                )
-                
-                return response.status_code == 200
-                
+            response = await self._client.patch(
+                f"/api/v1/products/{product_id}/stock",
+                json={"quantity_change": quantity_change}
+            )
+            
+            return response.status_code == 200
+            
         except Exception as e:
             logger.error(f"Error updating product stock {product_id}: {e}")
             return False
@@ -208,3 +224,9 @@ user_service_client = UserServiceClient()
 product_service_client = ProductServiceClient()
 
 
+async def close_service_clients():
+    """Close the pooled connections of the global service clients"""
+    await user_service_client.aclose()
+    await product_service_client.aclose()
+
+
@@ -1,7 +1,8 @@
 import os
-import json
+import asyncio
+import orjson
 import logging
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 from aiokafka import AIOKafkaProducer
 from aiokafka.errors import KafkaError
 
@@ -11,6 +12,11 @@ class KafkaProducer:
     def __init__(self):
         self.bootstrap_servers = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "localhost:9092")
         self.kafka_enabled = os.getenv("KAFKA_ENABLED", "false").lower() == "true"
+        self.service_name = "order-service"
+        # Events published within linger_ms of each other share one compressed batch
+        self.linger_ms = int(os.getenv("KAFKA_LINGER_MS", "5"))
+        self.max_batch_size = int(os.getenv("KAFKA_MAX_BATCH_SIZE", "65536"))
+        self.compression_type = os.getenv("KAFKA_COMPRESSION_TYPE", "lz4")
         self.producer: Optional[AIOKafkaProducer] = None
         
     async def start(self):
@@ -22,8 +28,12 @@ class KafkaProducer:
         try:
             self.producer = AIOKafkaProducer(
                 bootstrap_servers=self.bootstrap_servers,
-                value_serializer=lambda v: json.dumps(v).encode('utf-8'),
+                # orjson encodes datetimes natively, so event payloads carry them as-is
+                value_serializer=orjson.dumps,
                 key_serializer=lambda k: k.encode('utf-8') if k else None,
+                linger_ms=self.linger_ms,
+                max_batch_size=self.max_batch_size,
+                compression_type=self.compression_type,
                 retry_backoff_ms=1000,
                 request_timeout_ms=30000,
                 enable_idempotence=True
@@ -38,12 +48,20 @@ class KafkaProducer:
         """Stop the Kafka producer"""
         if self.producer:
             try:
+                # Deliver any events still buffered for batching before shutting down
+                await self.producer.flush()
                 await self.producer.stop()
                 logger.info("Kafka producer stopped successfully")
             except Exception as e:
                 logger.error(f"Error stopping Kafka producer: {e}")
     
-    async def send_event(self, topic: str, event_data: Dict[str, Any], key: Optional[str] = None):
+    async def send_event(
+        self,
+        topic: str,
+        event_data: Dict[str, Any],
+        key: Optional[str] = None,
+        timestamp: Optional[Any] = None
+    ):
         """Send an event to a Kafka topic"""
         if not self.kafka_enabled or not self.producer:
             logger.debug(f"Kafka disabled or producer not available, skipping event: {topic}")
@@ -52,21 +70,30 @@ class KafkaProducer:
         try:
             # Add metadata to the event
             enriched_event = {
-                "service": "order-service",
-                "timestamp": event_data.get("timestamp"),
+                "service": self.service_name,
+                "timestamp": timestamp,
                 "event_type": topic,
                 "data": event_data
             }
             
-            # Send the message
-            await self.producer.send_and_wait(topic, enriched_event, key=key)
-            logger.info(f"Event sent to topic '{topic}': {event_data.get('event_type', 'unknown')}")
+            # Queue the message; delivery happens in the background batch
+            delivery = await self.producer.send(topic, enriched_event, key=key)
+            delivery.add_done_callback(lambda result: self._log_delivery(topic, event_data, result))
             
         except KafkaError as e:
             logger.error(f"Kafka error sending event to topic '{topic}': {e}")
         except Exception as e:
             logger.error(f"Unexpected error sending event to topic '{topic}': {e}")
 
+    def _log_delivery(self, topic: str, event_data: Dict[str, Any], result: asyncio.Future):
+        """Log the outcome of a background event delivery"""
+        if result.cancelled():
+            logger.error(f"Delivery to topic '{topic}' was cancelled")
+        elif result.exception():
+            logger.error(f"Kafka error sending event to topic '{topic}': {result.exception()}")
+        else:
+            logger.info(f"Event sent to topic '{topic}': {event_data.get('event_type', 'unknown')}")
+
 # Global producer instance
 kafka_producer = KafkaProducer()
 
@@ -82,105 +109,82 @@ class OrderEvents:
     ORDER_REFUNDED = "order.refunded"
 
 # Helper functions for common events
-async def publish_order_created_event(order_data: Dict[str, Any]):
-    """Publish order created event"""
+def _build_order_event(
+    event_type: str,
+    order_data: Dict[str, Any],
+    timestamp_field: str,
+    fields: Tuple[str, ...] = (),
+    **extra: Any
+) -> Dict[str, Any]:
+    """Build an order event from the common order fields, the listed order_data fields and any extras"""
+    get = order_data.get
     event_data = {
-        "event_type": OrderEvents.ORDER_CREATED,
-        "order_id": order_data.get("id"),
-        "order_number": order_data.get("order_number"),
-        "user_id": order_data.get("user_id"),
-        "user_email": order_data.get("user_email"),
-        "total_amount": order_data.get("total_amount"),
-        "item_count": order_data.get("item_count"),
-        "items": order_data.get("items", []),
-        "timestamp": order_data.get("created_at")
+        "event_type": event_type,
+        "order_id": get("id"),
+        "order_number": get("order_number"),
+        "user_id": get("user_id"),
+        "user_email": get("user_email")
     }
-    await kafka_producer.send_event("order-events", event_data, key=order_data.get("id"))
+    for field in fields:
+        event_data[field] = get(field)
+    event_data.update(extra)
+    event_data["timestamp"] = get(timestamp_field)
+    return event_data
+
+async def _publish_order_event(event_data: Dict[str, Any]):
+    """Publish an order event keyed by order ID"""
+    await kafka_producer.send_event(
+        "order-events", event_data, key=event_data["order_id"], timestamp=event_data["timestamp"]
+    )
+
+async def publish_order_created_event(order_data: Dict[str, Any]):
+    """Publish order created event"""
+    await _publish_order_event(_build_order_event(
+        OrderEvents.ORDER_CREATED, order_data, "created_at",
+        fields=("total_amount", "item_count"),
+        items=order_data.get("items", [])
+    ))
 
 async def publish_order_confirmed_event(order_data: Dict[str, Any]):
     """Publish order confirmed event"""
-    event_data = {
-        "event_type": OrderEvents.ORDER_CONFIRMED,
-        "order_id": order_data.get("id"),
-        "order_number": order_data.get("order_number"),
-        "user_id": order_data.get("user_id"),
-        "user_email": order_data.get("user_email"),
-        "total_amount": order_data.get("total_amount"),
-        "items": order_data.get("items", []),
-        "timestamp": order_data.get("confirmed_at")
-    }
-    await kafka_producer.send_event("order-events", event_data, key=order_data.get("id"))
+    await _publish_order_event(_build_order_event(
+        OrderEvents.ORDER_CONFIRMED, order_data, "confirmed_at",
+        fields=("total_amount",),
+        items=order_data.get("items", [])
+    ))
 
 async def publish_order_cancelled_event(order_data: Dict[str, Any]):
     """Publish order cancelled event"""
-    event_data = {
-        "event_type": OrderEvents.ORDER_CANCELLED,
-        "order_id": order_data.get("id"),
-        "order_number": order_data.get("order_number"),
-        "user_id": order_data.get("user_id"),
-        "user_email": order_data.get("user_email"),
-        "total_amount": order_data.get("total_amount"),
-        "reason": order_data.get("cancellation_reason"),
-        "timestamp": order_data.get("updated_at")
-    }
-    await kafka_producer.send_event("order-events", event_data, key=order_data.get("id"))
+    await _publish_order_event(_build_order_event(
+        OrderEvents.ORDER_CANCELLED, order_data, "updated_at",
+        fields=("total_amount",),
+        reason=order_data.get("cancellation_reason")
+    ))
 
 async def publish_order_shipped_event(order_data: Dict[str, Any]):
     """Publish order shipped event"""
-    event_data = {
-        "event_type": OrderEvents.ORDER_SHIPPED,
-        "order_id": order_data.get("id"),
-        "order_number": order_data.get("order_number"),
-        "user_id": order_data.get("user_id"),
-        "user_email": order_data.get("user_email"),
-        "tracking_number": order_data.get("tracking_number"),
-        "shipping_method": order_data.get("shipping_method"),
-        "shipping_address": order_data.get("shipping_address"),
-        "timestamp": order_data.get("shipped_at")
-    }
-    await kafka_producer.send_event("order-events", event_data, key=order_data.get("id"))
+    await _publish_order_event(_build_order_event(
+        OrderEvents.ORDER_SHIPPED, order_data, "shipped_at",
+        fields=("tracking_number", "shipping_method", "shipping_address")
+    ))
 
 async def publish_order_delivered_event(order_data: Dict[str, Any]):
     """Publish order delivered event"""
-    event_data = {
-        "event_type": OrderEvents.ORDER_DELIVERED,
-        "order_id": order_data.get("id"),
-        "order_number": order_data.get("order_number"),
-        "user_id": order_data.get("user_id"),
-        "user_email": order_data.get("user_email"),
-        "total_amount": order_data.get("total_amount"),
-        "timestamp": order_data.get("delivered_at")
-    }
-    await kafka_producer.send_event("order-events", event_data, key=order_data.get("id"))
+    await _publish_order_event(_build_order_event(
+        OrderEvents.ORDER_DELIVERED, order_data, "delivered_at",
+        fields=("total_amount",)
+    ))
 
 async def publish_payment_completed_event(order_data: Dict[str, Any]):
     """Publish payment completed event"""
-    event_data = {
-        "event_type": OrderEvents.ORDER_PAYMENT_COMPLETED,
-        "order_id": order_data.get("id"),
-        "order_number": order_data.get("order_number"),
-        "user_id": order_data.get("user_id"),
-        "user_email": order_data.get("user_email"),
-        "total_amount": order_data.get("total_amount"),
-        "payment_method": order_data.get("payment_method"),
-        "payment_transaction_id": order_data.get("payment_transaction_id"),
-        "timestamp": order_data.get("updated_at")
-    }
-    await kafka_producer.send_event("order-events", event_data, key=order_data.get("id"))
+    await _publish_order_event(_build_order_event(
+        OrderEvents.ORDER_PAYMENT_COMPLETED, order_data, "updated_at",
+        fields=("total_amount", "payment_method", "payment_transaction_id")
+    ))
 
 async def publish_payment_failed_event(order_data: Dict[str, Any]):
     """Publish payment failed event"""
-    event_data = {
-        "event_type": OrderEvents.ORDER_PAYMENT_FAILED,
-        "order_id": order_data.get("id"),
-        "order_number": order_data.get("order_number"),
-        "user_id": order_data.get("user_id"),
-        "user_email": order_data.get("user_email"),
-        "total_amount": order_data.get("total_amount"),
-        "payment_method": order_data.get("payment_method"),
-        "failure_reason": order_data.get("failure_reason"),
-        "timestamp": order_data.get("updated_at")
-    }
-    await kafka_producer.send_event("order-events", event_data, key=order_data.get("id"))
-
-
+    await _publish_order_event(_build_order_event(
+        OrderEvents.ORDER_PAYMENT_FAILED, order_data, "updated_at",
+        fields=("total_amount", "payment_method", "failure_reason")
+    ))
@@ -1,13 +1,23 @@
-from typing import List, Optional
+import re
+from typing import List, Optional, Union, Literal
 from fastapi import APIRouter, HTTPException, status, Query
 from app.services.product_service import ProductService, CategoryService
 from app.schemas.product_schemas import (
     CategoryCreate, CategoryUpdate, CategoryResponse,
-    ProductCreate, ProductUpdate, ProductResponse, ProductListResponse,
-    ProductSearchQuery, StandardResponse
+    ProductCreate, ProductUpdate, ProductBulkCreate, ProductBulkUpdate,
+    ProductResponse, ProductListResponse, ProductBriefListResponse,
+    ProductSearchQuery, ProductReservationQuery, ProductReservationResponse,
+    StandardResponse
 )
 
 
+# Splits a comma-separated tag list, trimming the whitespace around each comma
+_TAG_SPLIT = re.compile(r"\s*,\s*")
+
+# Shared service instances, built once at import instead of per request
+category_service = CategoryService()
+product_service = ProductService()
+
 # Category router
 category_router = APIRouter(prefix="/api/v1/categories", tags=["Categories"])
 
@@ -20,7 +30,6 @@ async def create_category(category_data: CategoryCreate):
     - **name**: Category name (2-100 characters, must be unique)
     - **description**: Optional category description (max 500 characters)
     """
-    category_service = CategoryService()
     try:
         category = await category_service.create_category(category_data)
         return StandardResponse(
@@ -50,7 +59,6 @@ async def get_all_categories(
     - **limit**: Number of categories to return (default: 100, max: 100)
     - **active_only**: Return only active categories (default: true)
     """
-    category_service = CategoryService()
     try:
         categories = await category_service.get_all_categories(skip, limit, active_only)
         return categories
@@ -68,7 +76,6 @@ async def get_category_by_id(category_id: str):
     
     - **category_id**: Category ID
     """
-    category_service = CategoryService()
     try:
         category = await category_service.get_category_by_id(category_id)
         return category
@@ -91,7 +98,6 @@ async def update_category(category_id: str, update_data: CategoryUpdate):
     - **description**: New category description (optional)
     - **is_active**: Active status (optional)
     """
-    category_service = CategoryService()
     try:
         updated_category = await category_service.update_category(category_id, update_data)
         return StandardResponse(
@@ -115,7 +121,6 @@ async def delete_category(category_id: str):
     
     - **category_id**: Category ID
     """
-    category_service = CategoryService()
     try:
         result = await category_service.delete_category(category_id)
         return StandardResponse(
@@ -152,7 +157,6 @@ async def create_product(product_data: ProductCreate):
     - **weight**: Product weight in kg (optional)
     - **dimensions**: Product dimensions dict (optional)
     """
-    product_service = ProductService()
     try:
         product = await product_service.create_product(product_data)
         return StandardResponse(
@@ -169,21 +173,22 @@ async def create_product(product_data: ProductCreate):
         )
 
 
-@product_router.get("/", response_model=ProductListResponse)
+@product_router.get("/", response_model=Union[ProductListResponse, ProductBriefListResponse])
 async def get_all_products(
     page: int = Query(default=1, ge=1),
-    per_page: int = Query(default=20, ge=1, le=100)
+    per_page: int = Query(default=20, ge=1, le=100),
+    brief: bool = Query(default=False, description="Return only id, name, price, category_name, image_url, stock_quantity and is_available")
 ):
     """
     Get all products with pagination
     
     - **page**: Page number (default: 1)
     - **per_page**: Products per page (default: 20, max: 100)
+    - **brief**: Return only the list card, price and stock fields (default: false)
     """
-    product_service = ProductService()
     try:
         skip = (page - 1) * per_page
-        products = await product_service.get_all_products(skip, per_page)
+        products = await product_service.get_all_products(skip, per_page, brief=brief)
         return products
     except Exception as e:
         raise HTTPException(
@@ -192,7 +197,7 @@ async def get_all_products(
         )
 
 
-@product_router.get("/search", response_model=ProductListResponse)
+@product_router.get("/search", response_model=Union[ProductListResponse, ProductBriefListResponse])
 async def search_products(
     query: Optional[str] = Query(None, description="Search query for name/description/tags"),
     category_id: Optional[str] = Query(None, description="Filter by category ID"),
@@ -200,13 +205,16 @@ async def search_products(
     max_price: Optional[float] = Query(None, ge=0, description="Maximum price filter"),
     tags: Optional[str] = Query(None, description="Comma-separated tags to filter by"),
     is_available: Optional[bool] = Query(None, description="Filter by availability"),
+    match: Literal["word", "substring"] = Query(default="word", description="word uses the text index; substring matches any part of name/description"),
     page: int = Query(default=1, ge=1, description="Page number"),
-    per_page: int = Query(default=20, ge=1, le=100, description="Products per page")
+    per_page: int = Query(default=20, ge=1, le=100, description="Products per page"),
+    brief: bool = Query(default=False, description="Return only id, name, price, category_name, image_url, stock_quantity and is_available")
 ):
     """
     Search products with various filters
     
     - **query**: Text search in product name, description, and tags
+    - **match**: `word` (default) ranks whole-word matches via the text index; `substring` finds partial words but scans the collection
     - **category_id**: Filter by specific category
     - **min_price**: Minimum price filter
     - **max_price**: Maximum price filter
@@ -214,13 +222,13 @@ async def search_products(
     - **is_available**: Filter by availability status
     - **page**: Page number for pagination
     - **per_page**: Number of products per page
+    - **brief**: Return only the list card, price and stock fields
     """
-    product_service = ProductService()
     try:
         # Parse tags if provided
         tag_list = None
         if tags:
-            tag_list = [tag.strip() for tag in tags.split(",")]
+            tag_list = [tag for tag in _TAG_SPLIT.split(tags.strip()) if tag]
         
         search_query = ProductSearchQuery(
             query=query,
@@ -229,11 +237,12 @@ async def search_products(
             max_price=max_price,
             tags=tag_list,
             is_available=is_available,
+            match=match,
             page=page,
             per_page=per_page
         )
         
-        products = await product_service.search_products(search_query)
+        products = await product_service.search_products(search_query, brief=brief)
         return products
     except Exception as e:
         raise HTTPException(
@@ -242,6 +251,72 @@ async def search_products(
         )
 
 
+@product_router.post("/reserve", response_model=ProductReservationResponse)
+async def reserve_products(reservation_query: ProductReservationQuery):
+    """
+    Check that several products can be reserved in the requested quantities
+    
+    - **items**: Products and quantities to reserve (1-100)
+    
+    Stock is validated but not decremented; each item reports whether it could be reserved.
+    """
+    try:
+        return await product_service.check_reservation(reservation_query.items)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error"
+        )
+
+
+@product_router.post("/bulk", response_model=StandardResponse, status_code=status.HTTP_201_CREATED)
+async def import_products(bulk_data: ProductBulkCreate):
+    """
+    Import several products in one request
+    
+    - **products**: Products to create (1-1000), with the same fields as single product creation
+    
+    Products whose insert fails, such as a duplicate SKU, are skipped and counted as failed.
+    """
+    try:
+        result = await product_service.import_products(bulk_data.products)
+        return StandardResponse(
+            success=True,
+            message=f"Imported {result['inserted']} products",
+            data=result
+        )
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error"
+        )
+
+
+@product_router.patch("/bulk", response_model=StandardResponse)
+async def bulk_update_products(bulk_data: ProductBulkUpdate):
+    """
+    Update several products in one request
+    
+    - **updates**: Product IDs with their changes (1-1000); category changes are not supported
+    """
+    try:
+        result = await product_service.bulk_update_products(bulk_data.updates)
+        return StandardResponse(
+            success=True,
+            message=f"Updated {result['modified']} products",
+            data=result
+        )
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error"
+        )
+
+
 @product_router.get("/{product_id}", response_model=ProductResponse)
 async def get_product_by_id(product_id: str):
     """
@@ -249,7 +324,6 @@ async def get_product_by_id(product_id: str):
     
     - **product_id**: Product ID
     """
-    product_service = ProductService()
     try:
         product = await product_service.get_product_by_id(product_id)
         return product
@@ -270,7 +344,6 @@ async def update_product(product_id: str, update_data: ProductUpdate):
     - **product_id**: Product ID
     - All product fields are optional for updates
     """
-    product_service = ProductService()
     try:
         updated_product = await product_service.update_product(product_id, update_data)
         return StandardResponse(
@@ -294,7 +367,6 @@ async def delete_product(product_id: str):
     
     - **product_id**: Product ID
     """
-    product_service = ProductService()
     try:
         result = await product_service.delete_product(product_id)
         return StandardResponse(
@@ -321,7 +393,6 @@ async def update_product_stock(
     - **product_id**: Product ID
     - **quantity_change**: Amount to add/subtract from current stock (can be negative)
     """
-    product_service = ProductService()
     try:
         updated_product = await product_service.update_stock(product_id, quantity_change)
         return StandardResponse(
@@ -1,8 +1,11 @@
 import os
+import logging
 from motor.motor_asyncio import AsyncIOMotorClient
 from beanie import init_beanie
 from app.models.product import Product, Category
 
+logger = logging.getLogger(__name__)
+
 
 class Database:
     """Database connection and configuration"""
@@ -24,21 +27,30 @@ async def connect_to_mongo():
     )
     DATABASE_NAME = os.getenv("DATABASE_NAME", "ecommerce_products")
     
-    # Create client
-    db.client = AsyncIOMotorClient(MONGODB_URL)
+    # Create client with a pre-warmed, bounded connection pool
+    db.client = AsyncIOMotorClient(
+        MONGODB_URL,
+        minPoolSize=int(os.getenv("MONGO_MIN_POOL_SIZE", "20")),
+        maxPoolSize=int(os.getenv("MONGO_MAX_POOL_SIZE", "200")),
+        maxIdleTimeMS=int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "60000")),
+        serverSelectionTimeoutMS=int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "3000"))
+    )
     db.database = db.client[DATABASE_NAME]
     
+    # Open the first connection now instead of on the first request
+    await db.client.admin.command("ping")
+    
     # Initialize Beanie with the Product and Category models
     await init_beanie(database=db.database, document_models=[Product, Category])
     
-    print(f"Connected to MongoDB: {DATABASE_NAME}")
+    logger.info(f"Connected to MongoDB: {DATABASE_NAME}")
 
 
 async def close_mongo_connection():
     """Close database connection"""
     if db.client:
         db.client.close()
-        print("Disconnected from MongoDB")
+        logger.info("Disconnected from MongoDB")
 
 
 def get_database():
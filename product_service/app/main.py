@@ -1,9 +1,15 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
 from app.database.connection import connect_to_mongo, close_mongo_connection
 from app.controllers.product_controller import product_router, category_router
 from app.utils.kafka_producer import kafka_producer
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
 
 @asynccontextmanager
@@ -23,6 +29,7 @@ app = FastAPI(
     title="Product Service API",
     description="Microservice for product and category management with comprehensive CRUD operations",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
@@ -56,8 +63,7 @@ async def health_check():
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
     """Handle HTTP exceptions"""
-    from fastapi.responses import JSONResponse
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
         content={
             "success": False,
@@ -70,11 +76,10 @@ async def http_exception_handler(request, exc):
 @app.exception_handler(Exception)
 async def general_exception_handler(request, exc):
     """Handle general exceptions"""
-    from fastapi.responses import JSONResponse
     import traceback
-    print(f"Unhandled exception: {exc}")
-    print(traceback.format_exc())
-    return JSONResponse(
+    logger.error(f"Unhandled exception: {exc}")
+    logger.error(traceback.format_exc())
+    return ORJSONResponse(
         status_code=500,
         content={
             "success": False,
@@ -90,6 +95,8 @@ if __name__ == "__main__":
         "main:app",
         host="0.0.0.0",
         port=8001,  # Different port from User Service
-        reload=True
+        reload=True,
+        loop="uvloop",
+        http="httptools"
     )
 
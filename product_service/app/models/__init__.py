@@ -1,4 +1,3 @@
-from .product import Product, Category
-
-__all__ = ["Product", "Category"]
+from .product import Product, Category, ProductBrief
 
+__all__ = ["Product", "Category", "ProductBrief"]
@@ -1,9 +1,9 @@
 from datetime import datetime
 from typing import Optional, List
 from decimal import Decimal
-from beanie import Document
-from pydantic import BaseModel, Field
-from bson import ObjectId
+from beanie import Document, PydanticObjectId
+from pymongo import IndexModel, TEXT
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class Category(Document):
@@ -17,11 +17,6 @@ class Category(Document):
     
     class Settings:
         name = "categories"  # MongoDB collection name
-    
-    class Config:
-        json_encoders = {
-            ObjectId: str
-        }
 
 
 class Product(Document):
@@ -45,12 +40,23 @@ class Product(Document):
     
     class Settings:
         name = "products"  # MongoDB collection name
+        indexes = [
+            # Backs $text search, so queries no longer scan the collection with regexes
+            IndexModel([("name", TEXT), ("description", TEXT), ("tags", TEXT)], name="product_text_search"),
+            # Listing and search filters: category browsing and availability, both with price ranges
+            [("is_active", 1), ("category_id", 1), ("price", 1)],
+            [("is_active", 1), ("is_available", 1), ("price", 1)],
+            "tags",
+            # SKU is optional, so uniqueness only applies to products that have one
+            IndexModel(
+                [("sku", 1)],
+                unique=True,
+                partialFilterExpression={"sku": {"$type": "string"}}
+            )
+        ]
     
-    class Config:
-        json_encoders = {
-            ObjectId: str
-        }
-        schema_extra = {
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "name": "iPhone 15 Pro",
                 "description": "Latest iPhone with advanced camera system and A17 Pro chip",
@@ -65,4 +71,22 @@ class Product(Document):
                 "dimensions": {"length": 14.67, "width": 7.09, "height": 0.83}
             }
         }
+    )
 
+
+class ProductBrief(BaseModel):
+    """Projection of the Product fields needed for list cards and price and stock lookups"""
+    
+    id: PydanticObjectId = Field(alias="_id")
+    name: str
+    price: float
+    category_name: Optional[str] = None
+    image_urls: List[str] = Field(default_factory=list)
+    stock_quantity: int
+    is_available: bool
+    
+    class Settings:
+        projection = {
+            "_id": 1, "name": 1, "price": 1, "category_name": 1,
+            "image_urls": 1, "stock_quantity": 1, "is_available": 1
+        }
@@ -1,6 +1,28 @@
-from typing import Optional, List, Dict, Any
+import os
+import re
+import logging
+from typing import Optional, List, Dict, Any, Type, Union, Tuple
+from datetime import datetime
+from cachetools import TTLCache
+from pydantic import BaseModel
 from bson import ObjectId
-from app.models.product import Product, Category
+from beanie import UpdateResponse
+from beanie.operators import In
+from pymongo import ReturnDocument, InsertOne, UpdateOne
+from pymongo.errors import PyMongoError, BulkWriteError
+from app.models.product import Product, Category, ProductBrief
+from app.schemas.product_schemas import ProductUpdate
+
+logger = logging.getLogger(__name__)
+
+# Operations sent per bulk_write call when importing or updating many products
+BULK_WRITE_BATCH_SIZE = 1000
+
+# Categories change rarely, so lookups by ID and name are served in-process for a short TTL
+CATEGORY_CACHE_SIZE = int(os.getenv("CATEGORY_CACHE_SIZE", "1000"))
+CATEGORY_CACHE_TTL = int(os.getenv("CATEGORY_CACHE_TTL", "60"))
+_categories_by_id: TTLCache = TTLCache(maxsize=CATEGORY_CACHE_SIZE, ttl=CATEGORY_CACHE_TTL)
+_categories_by_name: TTLCache = TTLCache(maxsize=CATEGORY_CACHE_SIZE, ttl=CATEGORY_CACHE_TTL)
 
 
 class CategoryRepository:
@@ -15,16 +37,37 @@ class CategoryRepository:
     
     @staticmethod
     async def get_category_by_id(category_id: str) -> Optional[Category]:
-        """Get category by ID"""
+        """Get category by ID, using the short-lived category cache when possible"""
+        category = _categories_by_id.get(category_id)
+        if category is not None:
+            return category
+        
         try:
-            return await Category.get(ObjectId(category_id))
+            category = await Category.get(ObjectId(category_id))
         except Exception:
             return None
+        
+        if category:
+            _categories_by_id[category_id] = category
+        return category
     
     @staticmethod
     async def get_category_by_name(name: str) -> Optional[Category]:
-        """Get category by name"""
-        return await Category.find_one(Category.name == name)
+        """Get category by name, using the short-lived category cache when possible"""
+        category = _categories_by_name.get(name)
+        if category is not None:
+            return category
+        
+        category = await Category.find_one(Category.name == name)
+        if category:
+            _categories_by_name[name] = category
+        return category
+    
+    @staticmethod
+    def _invalidate_category(category_id: str):
+        """Drop a changed category from the caches (names can change, so the name cache is cleared)"""
+        _categories_by_id.pop(category_id, None)
+        _categories_by_name.clear()
     
     @staticmethod
     async def get_all_categories(skip: int = 0, limit: int = 100, active_only: bool = True) -> List[Category]:
@@ -36,36 +79,39 @@ class CategoryRepository:
     
     @staticmethod
     async def update_category(category_id: str, update_data: dict) -> Optional[Category]:
-        """Update category information"""
-        try:
-            category = await Category.get(ObjectId(category_id))
-            if category:
-                for field, value in update_data.items():
-                    if hasattr(category, field):
-                        setattr(category, field, value)
-                
-                from datetime import datetime
-                category.updated_at = datetime.utcnow()
-                await category.save()
-                return category
+        """Update category information with a single server-side $set"""
+        if not ObjectId.is_valid(category_id):
             return None
-        except Exception:
+        
+        fields = {field: value for field, value in update_data.items() if field in Category.model_fields}
+        fields["updated_at"] = datetime.utcnow()
+        try:
+            category = await Category.find_one(Category.id == ObjectId(category_id)).update(
+                {"$set": fields},
+                response_type=UpdateResponse.NEW_DOCUMENT
+            )
+        except PyMongoError:
             return None
+        
+        CategoryRepository._invalidate_category(category_id)
+        return category
     
     @staticmethod
     async def delete_category(category_id: str) -> bool:
         """Delete a category (soft delete by setting is_active to False)"""
-        try:
-            category = await Category.get(ObjectId(category_id))
-            if category:
-                category.is_active = False
-                from datetime import datetime
-                category.updated_at = datetime.utcnow()
-                await category.save()
-                return True
+        if not ObjectId.is_valid(category_id):
             return False
-        except Exception:
+        
+        try:
+            result = await Category.get_motor_collection().update_one(
+                {"_id": ObjectId(category_id)},
+                {"$set": {"is_active": False, "updated_at": datetime.utcnow()}}
+            )
+        except PyMongoError:
             return False
+        
+        CategoryRepository._invalidate_category(category_id)
+        return result.matched_count == 1
 
 
 class ProductRepository:
@@ -78,6 +124,63 @@ class ProductRepository:
         await product.insert()
         return product
     
+    @staticmethod
+    async def bulk_create_products(items: List[dict]) -> int:
+        """Insert many products with unordered bulk writes, returning the number inserted"""
+        # Validate through the model, but leave _id for the server to assign
+        operations = [
+            InsertOne(Product(**item).model_dump(by_alias=True, exclude={"id", "revision_id"}))
+            for item in items
+        ]
+        result = await ProductRepository._bulk_write(operations)
+        return result["inserted"]
+    
+    @staticmethod
+    async def bulk_update_products(updates: List[Tuple[str, dict]]) -> int:
+        """Apply many validated per-product $set updates with unordered bulk writes, returning the number modified"""
+        invalid_ids = [product_id for product_id, _ in updates if not ObjectId.is_valid(product_id)]
+        if invalid_ids:
+            raise ValueError(f"Invalid product IDs: {', '.join(invalid_ids)}")
+        
+        now = datetime.utcnow()
+        operations = []
+        for product_id, fields in updates:
+            changes = ProductUpdate.model_validate(fields).model_dump(exclude_none=True)
+            if "category_id" in changes:
+                # category_name is resolved by ProductService.update_product and would go stale here
+                raise ValueError("Category changes are not supported in bulk updates")
+            if "stock_quantity" in changes:
+                # Keep the invariant update_stock maintains: out-of-stock products are unavailable
+                changes["is_available"] = changes["stock_quantity"] > 0 and changes.get("is_available", True)
+            changes["updated_at"] = now
+            operations.append(UpdateOne({"_id": ObjectId(product_id)}, {"$set": changes}))
+        
+        result = await ProductRepository._bulk_write(operations)
+        return result["modified"]
+    
+    @staticmethod
+    async def _bulk_write(operations: list) -> Dict[str, int]:
+        """Send write operations to the products collection in fixed-size unordered batches"""
+        totals = {"inserted": 0, "modified": 0}
+        collection = Product.get_motor_collection()
+        for start in range(0, len(operations), BULK_WRITE_BATCH_SIZE):
+            try:
+                result = await collection.bulk_write(
+                    operations[start:start + BULK_WRITE_BATCH_SIZE],
+                    ordered=False
+                )
+            except BulkWriteError as e:
+                # Unordered batches still apply the other writes, e.g. around a duplicate SKU
+                write_errors = e.details.get("writeErrors", [])
+                logger.error(f"Bulk write failed for {len(write_errors)} product operations: {write_errors[:1]}")
+                totals["inserted"] += e.details.get("nInserted", 0)
+                totals["modified"] += e.details.get("nModified", 0)
+                continue
+            
+            totals["inserted"] += result.inserted_count
+            totals["modified"] += result.modified_count
+        return totals
+    
     @staticmethod
     async def get_product_by_id(product_id: str) -> Optional[Product]:
         """Get product by ID"""
@@ -86,17 +189,32 @@ class ProductRepository:
         except Exception:
             return None
     
+    @staticmethod
+    async def get_products_by_ids(product_ids: List[str]) -> List[Product]:
+        """Get active products by IDs with a single query, skipping malformed IDs"""
+        object_ids = [ObjectId(product_id) for product_id in product_ids if ObjectId.is_valid(product_id)]
+        if not object_ids:
+            return []
+        return await Product.find(In(Product.id, object_ids), Product.is_active == True).to_list()
+    
     @staticmethod
     async def get_product_by_sku(sku: str) -> Optional[Product]:
         """Get product by SKU"""
         return await Product.find_one(Product.sku == sku)
     
     @staticmethod
-    async def get_all_products(skip: int = 0, limit: int = 20, active_only: bool = True) -> List[Product]:
-        """Get all products with pagination"""
+    async def get_all_products(
+        skip: int = 0,
+        limit: int = 20,
+        active_only: bool = True,
+        projection_model: Optional[Type[BaseModel]] = None
+    ) -> List[Union[Product, ProductBrief]]:
+        """Get all products with pagination, optionally loading only a projection"""
         query = Product.find()
         if active_only:
             query = Product.find(Product.is_active == True)
+        if projection_model:
+            query = query.project(projection_model)
         return await query.skip(skip).limit(limit).to_list()
     
     @staticmethod
@@ -108,51 +226,89 @@ class ProductRepository:
         ).skip(skip).limit(limit).to_list()
     
     @staticmethod
-    async def search_products(
+    def _search_match(
         query: Optional[str] = None,
         category_id: Optional[str] = None,
         min_price: Optional[float] = None,
         max_price: Optional[float] = None,
         tags: Optional[List[str]] = None,
         is_available: Optional[bool] = None,
-        skip: int = 0,
-        limit: int = 20
-    ) -> List[Product]:
-        """Search products with various filters"""
-        filters = [Product.is_active == True]
+        use_regex: bool = False
+    ) -> Dict[str, Any]:
+        """Build the raw match filter for product search"""
+        filters: List[Dict[str, Any]] = [{"is_active": True}]
         
-        if query:
-            # Text search in name and description
+        if query and use_regex:
+            # Literal substring search in name and description (scans the collection)
+            pattern = re.escape(query)
             filters.append(
                 {"$or": [
-                    {"name": {"$regex": query, "$options": "i"}},
-                    {"description": {"$regex": query, "$options": "i"}},
+                    {"name": {"$regex": pattern, "$options": "i"}},
+                    {"description": {"$regex": pattern, "$options": "i"}},
                     {"tags": {"$in": [query]}}
                 ]}
             )
+        elif query:
+            # Word search through the product text index
+            filters.append({"$text": {"$search": query}})
         
         if category_id:
-            filters.append(Product.category_id == category_id)
+            filters.append({"category_id": category_id})
         
+        price_range = {}
         if min_price is not None:
-            filters.append(Product.price >= min_price)
-        
+            price_range["$gte"] = min_price
         if max_price is not None:
-            filters.append(Product.price <= max_price)
+            price_range["$lte"] = max_price
+        if price_range:
+            filters.append({"price": price_range})
         
         if tags:
-            filters.append(Product.tags.in_(tags))
+            filters.append({"tags": {"$in": tags}})
         
         if is_available is not None:
-            filters.append(Product.is_available == is_available)
+            filters.append({"is_available": is_available})
         
         # Combine all filters
-        if len(filters) == 1:
-            search_query = Product.find(filters[0])
-        else:
-            search_query = Product.find({"$and": filters})
+        return filters[0] if len(filters) == 1 else {"$and": filters}
+    
+    @staticmethod
+    async def search_with_count(
+        query: Optional[str] = None,
+        category_id: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        tags: Optional[List[str]] = None,
+        is_available: Optional[bool] = None,
+        skip: int = 0,
+        limit: int = 20,
+        projection_model: Optional[Type[BaseModel]] = None,
+        use_regex: bool = False
+    ) -> Tuple[List[Union[Product, ProductBrief]], int]:
+        """Search products and count every match in one aggregation, returning (page, total)"""
+        match = ProductRepository._search_match(
+            query, category_id, min_price, max_price, tags, is_available, use_regex
+        )
+        
+        page_stages: List[Dict[str, Any]] = []
+        if query and not use_regex:
+            page_stages.append({"$sort": {"score": {"$meta": "textScore"}}})
+        page_stages += [{"$skip": skip}, {"$limit": limit}]
+        if projection_model:
+            page_stages.append({"$project": projection_model.Settings.projection})
         
-        return await search_query.skip(skip).limit(limit).to_list()
+        # $facet pages and counts the same matched set, so the filter runs once
+        pipeline = [
+            {"$match": match},
+            {"$facet": {"items": page_stages, "total": [{"$count": "n"}]}}
+        ]
+        cursor = Product.get_motor_collection().aggregate(pipeline)
+        result = (await cursor.to_list(length=1))[0]
+        
+        model = projection_model or Product
+        items = [model.model_validate(document) for document in result["items"]]
+        total = result["total"][0]["n"] if result["total"] else 0
+        return items, total
     
     @staticmethod
     async def count_products(filters: Optional[Dict[str, Any]] = None) -> int:
@@ -163,55 +319,60 @@ class ProductRepository:
     
     @staticmethod
     async def update_product(product_id: str, update_data: dict) -> Optional[Product]:
-        """Update product information"""
-        try:
-            product = await Product.get(ObjectId(product_id))
-            if product:
-                for field, value in update_data.items():
-                    if hasattr(product, field):
-                        setattr(product, field, value)
-                
-                from datetime import datetime
-                product.updated_at = datetime.utcnow()
-                await product.save()
-                return product
+        """Update product information with a single server-side $set"""
+        if not ObjectId.is_valid(product_id):
             return None
-        except Exception:
+        
+        fields = {field: value for field, value in update_data.items() if field in Product.model_fields}
+        fields["updated_at"] = datetime.utcnow()
+        try:
+            return await Product.find_one(Product.id == ObjectId(product_id)).update(
+                {"$set": fields},
+                response_type=UpdateResponse.NEW_DOCUMENT
+            )
+        except PyMongoError:
             return None
     
     @staticmethod
     async def delete_product(product_id: str) -> bool:
         """Delete a product (soft delete by setting is_active to False)"""
-        try:
-            product = await Product.get(ObjectId(product_id))
-            if product:
-                product.is_active = False
-                from datetime import datetime
-                product.updated_at = datetime.utcnow()
-                await product.save()
-                return True
+        if not ObjectId.is_valid(product_id):
             return False
-        except Exception:
+        
+        try:
+            result = await Product.get_motor_collection().update_one(
+                {"_id": ObjectId(product_id)},
+                {"$set": {"is_active": False, "updated_at": datetime.utcnow()}}
+            )
+            return result.matched_count == 1
+        except PyMongoError:
             return False
     
     @staticmethod
     async def update_stock(product_id: str, quantity_change: int) -> Optional[Product]:
-        """Update product stock quantity"""
-        try:
-            product = await Product.get(ObjectId(product_id))
-            if product:
-                new_quantity = product.stock_quantity + quantity_change
-                if new_quantity < 0:
-                    return None  # Insufficient stock
-                
-                product.stock_quantity = new_quantity
-                product.is_available = new_quantity > 0
-                
-                from datetime import datetime
-                product.updated_at = datetime.utcnow()
-                await product.save()
-                return product
+        """Atomically adjust stock quantity, returning None if the product is missing or stock is insufficient"""
+        if not ObjectId.is_valid(product_id):
             return None
-        except Exception:
+        
+        query = {"_id": ObjectId(product_id)}
+        if quantity_change < 0:
+            # The database rejects the oversell instead of a read-modify-write check
+            query["stock_quantity"] = {"$gte": -quantity_change}
+        
+        try:
+            # Pipeline stages run in order, so is_available sees the new stock level
+            document = await Product.get_motor_collection().find_one_and_update(
+                query,
+                [
+                    {"$set": {
+                        "stock_quantity": {"$add": ["$stock_quantity", quantity_change]},
+                        "updated_at": datetime.utcnow()
+                    }},
+                    {"$set": {"is_available": {"$gt": ["$stock_quantity", 0]}}}
+                ],
+                return_document=ReturnDocument.AFTER
+            )
+        except PyMongoError:
             return None
-
+        
+        return Product.model_validate(document) if document else None
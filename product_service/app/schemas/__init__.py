@@ -4,9 +4,18 @@ from .product_schemas import (
     CategoryResponse,
     ProductCreate,
     ProductUpdate,
+    ProductBulkCreate,
+    ProductBulkUpdateItem,
+    ProductBulkUpdate,
     ProductResponse,
     ProductListResponse,
+    ProductBriefResponse,
+    ProductBriefListResponse,
     ProductSearchQuery,
+    ReservationItem,
+    ProductReservationQuery,
+    ProductReservation,
+    ProductReservationResponse,
     StandardResponse
 )
 
@@ -16,9 +25,18 @@ __all__ = [
     "CategoryResponse",
     "ProductCreate",
     "ProductUpdate",
+    "ProductBulkCreate",
+    "ProductBulkUpdateItem",
+    "ProductBulkUpdate",
     "ProductResponse",
     "ProductListResponse",
+    "ProductBriefResponse",
+    "ProductBriefListResponse",
     "ProductSearchQuery",
+    "ReservationItem",
+    "ProductReservationQuery",
+    "ProductReservation",
+    "ProductReservationResponse",
     "StandardResponse"
 ]
 
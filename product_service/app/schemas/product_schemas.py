@@ -1,6 +1,6 @@
 from datetime import datetime
-from typing import Optional, List
-from pydantic import BaseModel, Field
+from typing import Optional, List, Literal
+from pydantic import BaseModel, ConfigDict, Field
 from decimal import Decimal
 
 
@@ -27,8 +27,7 @@ class CategoryResponse(BaseModel):
     created_at: datetime
     updated_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # Product Schemas
@@ -63,6 +62,22 @@ class ProductUpdate(BaseModel):
     dimensions: Optional[dict] = None
 
 
+class ProductBulkCreate(BaseModel):
+    """Schema for importing several products in one request"""
+    products: List[ProductCreate] = Field(..., min_length=1, max_length=1000)
+
+
+class ProductBulkUpdateItem(BaseModel):
+    """Schema for the changes to one product in a bulk update"""
+    id: str
+    changes: ProductUpdate
+
+
+class ProductBulkUpdate(BaseModel):
+    """Schema for updating several products in one request"""
+    updates: List[ProductBulkUpdateItem] = Field(..., min_length=1, max_length=1000)
+
+
 class ProductResponse(BaseModel):
     """Schema for product response"""
     id: str
@@ -82,8 +97,7 @@ class ProductResponse(BaseModel):
     created_at: datetime
     updated_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class ProductListResponse(BaseModel):
@@ -95,6 +109,26 @@ class ProductListResponse(BaseModel):
     total_pages: int
 
 
+class ProductBriefResponse(BaseModel):
+    """Schema for the brief product view (list card fields, price and stock)"""
+    id: str
+    name: str
+    price: float
+    category_name: Optional[str] = None
+    image_url: Optional[str] = None  # First product image, used as the thumbnail
+    stock_quantity: int
+    is_available: bool
+
+
+class ProductBriefListResponse(BaseModel):
+    """Schema for brief product list response with pagination"""
+    products: List[ProductBriefResponse]
+    total: int
+    page: int
+    per_page: int
+    total_pages: int
+
+
 class ProductSearchQuery(BaseModel):
     """Schema for product search query"""
     query: Optional[str] = None
@@ -103,10 +137,40 @@ class ProductSearchQuery(BaseModel):
     max_price: Optional[float] = Field(None, ge=0)
     tags: Optional[List[str]] = None
     is_available: Optional[bool] = None
+    match: Literal["word", "substring"] = "word"  # substring scans the collection instead of using the text index
     page: int = Field(default=1, ge=1)
     per_page: int = Field(default=20, ge=1, le=100)
 
 
+class ReservationItem(BaseModel):
+    """Schema for one product and quantity to reserve"""
+    product_id: str
+    quantity: int = Field(..., gt=0)
+
+
+class ProductReservationQuery(BaseModel):
+    """Schema for checking several products for reservation in one request"""
+    items: List[ReservationItem] = Field(..., min_length=1, max_length=100)
+
+
+class ProductReservation(BaseModel):
+    """Schema for the reservation outcome of one item"""
+    product_id: str
+    quantity: int
+    reserved: bool
+    product: Optional[ProductResponse] = None
+    reason: Optional[str] = None
+    available_quantity: Optional[int] = None
+
+
+class ProductReservationResponse(BaseModel):
+    """Schema for a batch reservation response"""
+    success: bool
+    total_items: int
+    reserved_items: int
+    reservations: List[ProductReservation]
+
+
 class StandardResponse(BaseModel):
     """Standard API response schema"""
     success: bool
@@ -1,15 +1,36 @@
-from typing import Optional, List
+from typing import Optional, List, Dict, Union
 from fastapi import HTTPException, status
-from app.models.product import Product, Category
+from app.models.product import Product, Category, ProductBrief
 from app.repositories.product_repository import ProductRepository, CategoryRepository
 from app.schemas.product_schemas import (
     CategoryCreate, CategoryUpdate, CategoryResponse,
-    ProductCreate, ProductUpdate, ProductResponse, ProductListResponse,
-    ProductSearchQuery
+    ProductCreate, ProductUpdate, ProductBulkUpdateItem, ProductResponse, ProductListResponse,
+    ProductBriefResponse, ProductBriefListResponse, ProductSearchQuery, ReservationItem, ProductReservation, ProductReservationResponse
 )
 import math
 
 
+def _reservation_for(item: ReservationItem, product: Optional[ProductResponse]) -> ProductReservation:
+    """Build the reservation outcome for one item from its looked-up product"""
+    if product and product.is_available and product.stock_quantity >= item.quantity:
+        return ProductReservation(product_id=item.product_id, quantity=item.quantity, reserved=True, product=product)
+    
+    if not product:
+        reason, available_quantity = "Product not found", 0
+    elif not product.is_available:
+        reason, available_quantity = "Product not available", 0
+    else:
+        reason, available_quantity = "Insufficient stock", product.stock_quantity
+    
+    return ProductReservation(
+        product_id=item.product_id,
+        quantity=item.quantity,
+        reserved=False,
+        reason=reason,
+        available_quantity=available_quantity
+    )
+
+
 class CategoryService:
     """Service layer for Category business logic"""
     
@@ -181,6 +202,36 @@ class ProductService:
             updated_at=product.updated_at
         )
     
+    async def import_products(self, products_data: List[ProductCreate]) -> dict:
+        """Create many products with bulk writes; rows that fail to insert (e.g. duplicate SKU) are skipped"""
+        # Resolve each distinct category once instead of per product
+        category_names = {}
+        for category_id in {product.category_id for product in products_data if product.category_id}:
+            category = await self.category_repository.get_category_by_id(category_id)
+            if not category:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Category not found: {category_id}"
+                )
+            category_names[category_id] = category.name
+        
+        inserted = await self.product_repository.bulk_create_products([
+            {**product.model_dump(), "category_name": category_names.get(product.category_id)}
+            for product in products_data
+        ])
+        return {"inserted": inserted, "failed": len(products_data) - inserted}
+    
+    async def bulk_update_products(self, updates: List[ProductBulkUpdateItem]) -> dict:
+        """Update many products with bulk writes"""
+        try:
+            modified = await self.product_repository.bulk_update_products([
+                (update.id, update.changes.model_dump(exclude_none=True)) for update in updates
+            ])
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        
+        return {"modified": modified}
+    
     async def get_product_by_id(self, product_id: str) -> ProductResponse:
         """Get product by ID"""
         product = await self.product_repository.get_product_by_id(product_id)
@@ -209,45 +260,87 @@ class ProductService:
             updated_at=product.updated_at
         )
     
-    async def get_all_products(self, skip: int = 0, limit: int = 20) -> ProductListResponse:
-        """Get all products with pagination"""
-        products = await self.product_repository.get_all_products(skip, limit)
+    async def get_products_by_ids(self, product_ids: List[str]) -> Dict[str, ProductResponse]:
+        """Get several products by ID, keyed by ID; unknown or inactive products are omitted"""
+        products = await self.product_repository.get_products_by_ids(product_ids)
+        return {str(product.id): self._to_response(product) for product in products}
+    
+    async def check_reservation(self, items: List[ReservationItem]) -> ProductReservationResponse:
+        """Check that every item can be reserved, loading all products with a single query"""
+        products = await self.get_products_by_ids([item.product_id for item in items])
+        
+        reservations = [_reservation_for(item, products.get(item.product_id)) for item in items]
+        
+        reserved_items = sum(1 for reservation in reservations if reservation.reserved)
+        return ProductReservationResponse(
+            success=reserved_items == len(items),
+            total_items=len(items),
+            reserved_items=reserved_items,
+            reservations=reservations
+        )
+    
+    @staticmethod
+    def _to_brief_response(product: ProductBrief) -> ProductBriefResponse:
+        """Convert a ProductBrief projection to ProductBriefResponse"""
+        return ProductBriefResponse(
+            id=str(product.id),
+            name=product.name,
+            price=product.price,
+            category_name=product.category_name,
+            image_url=product.image_urls[0] if product.image_urls else None,
+            stock_quantity=product.stock_quantity,
+            is_available=product.is_available
+        )
+    
+    @staticmethod
+    def _to_response(product: Product) -> ProductResponse:
+        """Convert Product model to ProductResponse"""
+        return ProductResponse(
+            id=str(product.id),
+            name=product.name,
+            description=product.description,
+            price=product.price,
+            category_id=product.category_id,
+            category_name=product.category_name,
+            sku=product.sku,
+            stock_quantity=product.stock_quantity,
+            is_available=product.is_available,
+            is_active=product.is_active,
+            image_urls=product.image_urls,
+            tags=product.tags,
+            weight=product.weight,
+            dimensions=product.dimensions,
+            created_at=product.created_at,
+            updated_at=product.updated_at
+        )
+    
+    async def get_all_products(
+        self, skip: int = 0, limit: int = 20, brief: bool = False
+    ) -> Union[ProductListResponse, ProductBriefListResponse]:
+        """Get all products with pagination, loading only the brief fields when brief is set"""
+        products = await self.product_repository.get_all_products(
+            skip, limit, projection_model=ProductBrief if brief else None
+        )
         total = await self.product_repository.count_products()
         
-        product_responses = [
-            ProductResponse(
-                id=str(product.id),
-                name=product.name,
-                description=product.description,
-                price=product.price,
-                category_id=product.category_id,
-                category_name=product.category_name,
-                sku=product.sku,
-                stock_quantity=product.stock_quantity,
-                is_available=product.is_available,
-                is_active=product.is_active,
-                image_urls=product.image_urls,
-                tags=product.tags,
-                weight=product.weight,
-                dimensions=product.dimensions,
-                created_at=product.created_at,
-                updated_at=product.updated_at
-            ) for product in products
-        ]
+        response_model = ProductBriefListResponse if brief else ProductListResponse
+        convert = self._to_brief_response if brief else self._to_response
         
-        return ProductListResponse(
-            products=product_responses,
+        return response_model(
+            products=[convert(product) for product in products],
             total=total,
             page=skip // limit + 1,
             per_page=limit,
             total_pages=math.ceil(total / limit)
         )
     
-    async def search_products(self, search_query: ProductSearchQuery) -> ProductListResponse:
-        """Search products with filters"""
+    async def search_products(
+        self, search_query: ProductSearchQuery, brief: bool = False
+    ) -> Union[ProductListResponse, ProductBriefListResponse]:
+        """Search products with filters, loading only the brief fields when brief is set"""
         skip = (search_query.page - 1) * search_query.per_page
         
-        products = await self.product_repository.search_products(
+        products, total = await self.product_repository.search_with_count(
             query=search_query.query,
             category_id=search_query.category_id,
             min_price=search_query.min_price,
@@ -255,35 +348,16 @@ class ProductService:
             tags=search_query.tags,
             is_available=search_query.is_available,
             skip=skip,
-            limit=search_query.per_page
+            limit=search_query.per_page,
+            projection_model=ProductBrief if brief else None,
+            use_regex=search_query.match == "substring"
         )
         
-        # Count total matching products (simplified - would need proper count with filters)
-        total = len(products)  # This is approximate, in production you'd want proper counting
-        
-        product_responses = [
-            ProductResponse(
-                id=str(product.id),
-                name=product.name,
-                description=product.description,
-                price=product.price,
-                category_id=product.category_id,
-                category_name=product.category_name,
-                sku=product.sku,
-                stock_quantity=product.stock_quantity,
-                is_available=product.is_available,
-                is_active=product.is_active,
-                image_urls=product.image_urls,
-                tags=product.tags,
-                weight=product.weight,
-                dimensions=product.dimensions,
-                created_at=product.created_at,
-                updated_at=product.updated_at
-            ) for product in products
-        ]
+        response_model = ProductBriefListResponse if brief else ProductListResponse
+        convert = self._to_brief_response if brief else self._to_response
         
-        return ProductListResponse(
-            products=product_responses,
+        return response_model(
+            products=[convert(product) for product in products],
             total=total,
             page=search_query.page,
             per_page=search_query.per_page,
@@ -1,5 +1,6 @@
 import os
-import json
+import asyncio
+import orjson
 import logging
 from typing import Dict, Any, Optional
 from aiokafka import AIOKafkaProducer
@@ -11,6 +12,11 @@ class KafkaProducer:
     def __init__(self):
         self.bootstrap_servers = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "localhost:9092")
         self.kafka_enabled = os.getenv("KAFKA_ENABLED", "false").lower() == "true"
+        self.service_name = "product-service"
+        # Events published within linger_ms of each other share one compressed batch
+        self.linger_ms = int(os.getenv("KAFKA_LINGER_MS", "5"))
+        self.max_batch_size = int(os.getenv("KAFKA_MAX_BATCH_SIZE", "65536"))
+        self.compression_type = os.getenv("KAFKA_COMPRESSION_TYPE", "lz4")
         self.producer: Optional[AIOKafkaProducer] = None
         
     async def start(self):
@@ -22,8 +28,12 @@ class KafkaProducer:
         try:
             self.producer = AIOKafkaProducer(
                 bootstrap_servers=self.bootstrap_servers,
-                value_serializer=lambda v: json.dumps(v).encode('utf-8'),
+                # orjson returns bytes directly and encodes datetimes natively
+                value_serializer=orjson.dumps,
                 key_serializer=lambda k: k.encode('utf-8') if k else None,
+                linger_ms=self.linger_ms,
+                max_batch_size=self.max_batch_size,
+                compression_type=self.compression_type,
                 retry_backoff_ms=1000,
                 request_timeout_ms=30000,
                 enable_idempotence=True
@@ -38,12 +48,20 @@ class KafkaProducer:
         """Stop the Kafka producer"""
         if self.producer:
             try:
+                # Deliver any events still buffered for batching before shutting down
+                await self.producer.flush()
                 await self.producer.stop()
                 logger.info("Kafka producer stopped successfully")
             except Exception as e:
                 logger.error(f"Error stopping Kafka producer: {e}")
     
-    async def send_event(self, topic: str, event_data: Dict[str, Any], key: Optional[str] = None):
+    async def send_event(
+        self,
+        topic: str,
+        event_data: Dict[str, Any],
+        key: Optional[str] = None,
+        timestamp: Optional[Any] = None
+    ):
         """Send an event to a Kafka topic"""
         if not self.kafka_enabled or not self.producer:
             logger.debug(f"Kafka disabled or producer not available, skipping event: {topic}")
@@ -52,22 +70,32 @@ class KafkaProducer:
         try:
             # Add metadata to the event
             enriched_event = {
-                "service": "product-service",
-                "timestamp": event_data.get("timestamp"),
+                "service": self.service_name,
+                "timestamp": timestamp,
                 "event_type": topic,
                 "data": event_data
             }
             
-            # Send the message
-            await self.producer.send_and_wait(topic, enriched_event, key=key)
-            logger.info(f"Event sent to topic '{topic}': {event_data.get('event_type', 'unknown')}")
+            # Queue the message; delivery happens in the background batch
+            delivery = await self.producer.send(topic, enriched_event, key=key)
+            delivery.add_done_callback(lambda result: self._log_delivery(topic, event_data, result))
             
         except KafkaError as e:
             logger.error(f"Kafka error sending event to topic '{topic}': {e}")
         except Exception as e:
             logger.error(f"Unexpected error sending event to topic '{topic}': {e}")
 
-# Global producer instance
+    def _log_delivery(self, topic: str, event_data: Dict[str, Any], result: asyncio.Future):
+        """Log the outcome of a background event delivery"""
+        if result.cancelled():
+            logger.error(f"Delivery to topic '{topic}' was cancelled")
+        elif result.exception():
+            logger.error(f"Kafka error sending event to topic '{topic}': {result.exception()}")
+        else:
+            logger.info(f"Event sent to topic '{topic}': {event_data.get('event_type', 'unknown')}")
+
+# Global producer instance, started once in the app lifespan; AIOKafkaProducer is safe to share
+# across concurrent requests on the event loop, so never construct one per request
 kafka_producer = KafkaProducer()
 
 # Event types for product service
@@ -92,7 +120,9 @@ async def publish_product_created_event(product_data: Dict[str, Any]):
         "stock_quantity": product_data.get("stock_quantity"),
         "timestamp": product_data.get("created_at")
     }
-    await kafka_producer.send_event("product-events", event_data, key=product_data.get("id"))
+    await kafka_producer.send_event(
+        "product-events", event_data, key=product_data.get("id"), timestamp=event_data["timestamp"]
+    )
 
 async def publish_product_updated_event(product_data: Dict[str, Any]):
     """Publish product updated event"""
@@ -105,7 +135,9 @@ async def publish_product_updated_event(product_data: Dict[str, Any]):
         "stock_quantity": product_data.get("stock_quantity"),
         "timestamp": product_data.get("updated_at")
     }
-    await kafka_producer.send_event("product-events", event_data, key=product_data.get("id"))
+    await kafka_producer.send_event(
+        "product-events", event_data, key=product_data.get("id"), timestamp=event_data["timestamp"]
+    )
 
 async def publish_product_stock_updated_event(product_data: Dict[str, Any]):
     """Publish product stock updated event"""
@@ -116,7 +148,9 @@ async def publish_product_stock_updated_event(product_data: Dict[str, Any]):
         "previous_stock": product_data.get("previous_stock"),
         "timestamp": product_data.get("updated_at")
     }
-    await kafka_producer.send_event("product-events", event_data, key=product_data.get("id"))
+    await kafka_producer.send_event(
+        "product-events", event_data, key=product_data.get("id"), timestamp=event_data["timestamp"]
+    )
 
 async def publish_category_created_event(category_data: Dict[str, Any]):
     """Publish category created event"""
@@ -127,5 +161,7 @@ async def publish_category_created_event(category_data: Dict[str, Any]):
         "description": category_data.get("description"),
         "timestamp": category_data.get("created_at")
     }
-    await kafka_producer.send_event("product-events", event_data, key=category_data.get("id"))
+    await kafka_producer.send_event(
+        "product-events", event_data, key=category_data.get("id"), timestamp=event_data["timestamp"]
+    )
 